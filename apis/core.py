@@ -1,12 +1,14 @@
 import datetime
 import json
+import logging
 import os
 
 from flask import make_response, jsonify, request
 from flask_restx import Namespace, Resource, fields
 
 from utils import list_keys
-from .handling import generate_yara_rule
+from .handling import generate_yara_rule, generate_yara_rules
+from yara_toolkit.yara_ruleset import RULESET
 
 from handlers import git_handler
 from database.operations import update_rule, get_rule, get_rules
@@ -71,6 +73,10 @@ yara_rule_model = api.model('YARA-Rule', {
     "condition": fields.String(required=True)
 })
 
+yara_rules_model = api.model('YARA-Rules', {
+    "rules": fields.List(fields.Nested(yara_rule_model, required=True), required=True)
+})
+
 error_or_warning_feedback_model = api.model('Warning or Error', {
     "column_number": fields.Integer,
     "line_number": fields.Integer,
@@ -89,6 +95,30 @@ post_yara_rule_output_model = api.model('POST YARA Rule Output', {
     "warning": fields.Nested(error_or_warning_feedback_model),
 })
 
+post_yara_rules_result_model = api.model('POST YARA Rules Result', {
+    "in": fields.Nested(yara_rule_model),
+    "out": fields.Nested(post_yara_rule_output_model)
+})
+
+post_yara_rules_output_model = api.model('POST YARA Rules Output', {
+    "rules": fields.List(fields.Nested(post_yara_rules_result_model))
+})
+
+post_ruleset_match_input_model = api.model('POST Ruleset Match Input', {
+    "data": fields.String(required=True, description="Data to match against the application wide ruleset.")
+})
+
+ruleset_match_model = api.model('Ruleset Match', {
+    "rule": fields.String,
+    "namespace": fields.String,
+    "tags": fields.List(fields.String),
+    "meta": fields.Raw
+})
+
+post_ruleset_match_output_model = api.model('POST Ruleset Match Output', {
+    "matches": fields.List(fields.Nested(ruleset_match_model))
+})
+
 post_commit_input_model = api.model('POST Commit Input', {
     "source_path": fields.String(required=True, description="Path to (YARA sourcecode) file to be commited."),
     "name": fields.String(required=True, description="Name of YARA Rule (used in commit msg)."),
@@ -282,8 +312,10 @@ class RuleRequest(Resource):
     def get(self, id):
         """Returns a specific rule."""
         retv = jsonify(get_rule(thehive_case_id=id))
-        log.info("GET '{route}/{id}' return JSON: {retv}".format(
-            route='/rule', id=id, retv=json.dumps(retv.json, indent=4)))
+        # Avoid re-parsing and re-serializing the response unless it is actually logged.
+        if log.isEnabledFor(logging.INFO):
+            log.info("GET '{route}/{id}' return JSON: {retv}".format(
+                route='/rule', id=id, retv=json.dumps(retv.json, indent=4)))
 
         return retv
 
@@ -330,9 +362,51 @@ class RulesRequest(Resource):
         """Returns all rules."""
         rules = get_rules()
         retv = jsonify({"rules": rules})
-        log.info("HTTP GET '{route}' returning {num}x JSON{keys_list}:\n{js}".format(
-            route='/rules',
-            num=len(rules), keys_list=str(list_keys(rules)), js=json.dumps(retv.json, indent=4)))
+        # Avoid re-parsing and re-serializing the response unless it is actually logged.
+        if log.isEnabledFor(logging.INFO):
+            log.info("HTTP GET '{route}' returning {num}x JSON{keys_list}:\n{js}".format(
+                route='/rules',
+                num=len(rules), keys_list=str(list_keys(rules)), js=json.dumps(retv.json, indent=4)))
 
         return retv
 
+
+@api.route('/rules/batch', methods=['POST'])
+class RulesBatchRequest(Resource):
+    @api.expect(yara_rules_model)
+    @api.response(200, "Success", model=post_yara_rules_output_model)
+    def post(self):
+        """
+        Takes a JSON containing a list of recipes for YARA Rules, then returns the generated YARA Rules.
+        """
+        # Avoid serializing the (potentially large) batch unless it is actually logged.
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Received HTTP POST '{route}' Request{mimetype}: {req_json}".format(
+                route='/rules/batch',
+                req_json=json.dumps(request.json, indent=4),
+                mimetype=" ({})".format(request.headers['Content-Type']) if 'Content-Type' in request.headers else "")
+            )
+
+        return jsonify({"rules": generate_yara_rules(request.json["rules"])})
+
+
+@api.route('/ruleset/match', methods=['POST'])
+class RulesetMatchRequest(Resource):
+    @api.expect(post_ruleset_match_input_model)
+    @api.response(200, "Success", model=post_ruleset_match_output_model)
+    def post(self):
+        """
+        Matches the given data against the application wide ruleset (all compilable rules), then returns the matches.
+        """
+        matches = RULESET.match(data=request.json["data"])
+        log.debug("HTTP POST '{route}' matched {num} rules.".format(route='/ruleset/match', num=len(matches)))
+
+        return jsonify({
+            "matches": [
+                {
+                    "rule": match.rule,
+                    "namespace": match.namespace,
+                    "tags": match.tags,
+                    "meta": match.meta
+                } for match in matches]
+        })
@@ -1,6 +1,7 @@
 import datetime
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from handlers import git_handler
 from flask import request, jsonify, make_response
@@ -13,7 +14,10 @@ from handlers import config_handler
 from database.operations import update_rule, get_rule, get_rules
 from handlers.config_handler import CONFIG
 from handlers.log_handler import create_logger
-from yara_toolkit.yara_rule import YaraRule, YaraRuleSyntaxError, YaraWarningError, YaraTimeoutError
+from yara_toolkit.yara_rule import YaraRule, YaraRuleSyntaxError, YaraWarningError, YaraTimeoutError, \
+    COMPILED_DIGEST_FILE_EXTENSION, YARA_ERROR_PATTERN
+from yara_toolkit.yara_ruleset import RULESET
+from yara_toolkit.utils import sanitize_identifier
 
 log = create_logger(__name__)
 
@@ -36,11 +40,12 @@ def imd_to_dict(imd: ImmutableMultiDict):
     return dct
 
 
-def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compiled=True) -> dict:
+def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compiled=True, source_path: str = None) -> dict:
     """
     Generates a YARA Rule based on a given dict and stores
     the sourcecode (and optionally compiled binary) as a file.
 
+    :param source_path: Path of the already saved source file (e.g. by YaraRule.save_sources), skips saving it.
     :param verify_compiled: Verify that the compiled YARA rule is parsable.
 
                             Saves compiled binary to file, then parses it
@@ -94,7 +99,7 @@ def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compil
     # General catch-all try-block for any unforseen exceptions, in order to not kill backend on-exception.
     try:
         # Save rule source code to text file and store the returned filepath for use in frontend.
-        retv["source_path"] = rule.save_source()
+        retv["source_path"] = rule.save_source() if source_path is None else source_path
 
         if CONFIG["yara_ignore_compiler_errors"]:
             log.warning("Proceeding with ignoring compiler errors (specified by config)!")
@@ -121,7 +126,8 @@ def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compil
             # Compile and save file to verify the validity of the YARA code.
             try:
                 # Run first with error_on_warning so that warning are raised as exceptions and can be stored.
-                rule.compile(save_file=verify_compiled, error_on_warning=True)
+                # NB: Only validates, the (saved) compilation is done below regardless.
+                rule.compile(error_on_warning=True, validate_only=True)
                 retv["compilable"] = True
             except YaraWarningError as yarawe_exc:
                 log.warning("YARA Rule Compilation warning", exc_info=yarawe_exc)
@@ -131,12 +137,13 @@ def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compil
                 retv["warning"]["message"] = str(yarawe_exc)
 
                 # Add line number info if it is in the string.
-                if str(yarawe_exc).startswith("line"):
-                    retv["warning"]["line_number"] = str(yarawe_exc).split(':')[0][len('line '):]
+                warning_match = YARA_ERROR_PATTERN.match(str(yarawe_exc))
+                if warning_match is not None:
+                    retv["warning"]["line_number"] = warning_match.group(1)
 
                     # If line number is in the string then the offending string should also be in there.
                     try:
-                        retv["warning"]["word"] = str(yarawe_exc).split(':')[1].split(' ')[1]
+                        retv["warning"]["word"] = warning_match.group(2).split(' ')[0]
                     except Exception as exc:
                         # If it fails, it shouldn't be critical, we just end up with less available info.
                         log.warning("Failed to determine word from YaraWarningError exception", exc_info=exc)
@@ -171,6 +178,12 @@ def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compil
                 log.info("Removing compiled YARA binary: {}".format(rule_from_compiled.compiled_path))
                 os.remove(rule_from_compiled.compiled_path)
 
+                # Remove the compiled binary's source digest sidecar file as well (if any).
+                try:
+                    os.remove(rule_from_compiled.compiled_path + COMPILED_DIGEST_FILE_EXTENSION)
+                except FileNotFoundError:
+                    pass
+
     except Exception as e:
         retv["success"] = False
         retv["error"] = {"type": "exception", "message": str(e)}
@@ -180,6 +193,10 @@ def create_yara_file(yara_sources_dict: dict, keep_compiled=False, verify_compil
 
     retv["success"] = True
 
+    # Include the (compilable) rule in the application wide ruleset.
+    if retv["compilable"]:
+        RULESET.add(rule)
+
     return retv
 
 
@@ -271,3 +288,89 @@ def generate_yara_rule(yara_rule_json: json):
             return retv
 
     return retv
+
+
+def generate_yara_rules(yara_rule_jsons: list) -> list:
+    """
+    Batch version of generate_yara_rule, generates multiple YARA Rules in one go.
+
+    The YARA files are created (and compiled) concurrently, with the exception of rules sharing a name
+    which are handled in order as they're saved to the same file. Git operations are performed
+    sequentially afterwards.
+
+    NB: Of the rules sharing a name only the last one's source is saved, so only it reports a source_path.
+
+    :param yara_rule_jsons: List of YARA Rule dicts (see create_yara_file).
+    :return:                List of dicts on the form of {"in": yara_rule_json, "out": dict}, in the given order.
+    """
+    log.debug("Received {} YARA Rule Dicts.".format(len(yara_rule_jsons)))
+    retvs = [{"in": yara_rule_json} for yara_rule_json in yara_rule_jsons]
+
+    the_oracle_repo = git_handler.clone_if_not_exist(url=CONFIG["theoracle_repo"], path=CONFIG["theoracle_local_path"])
+
+    # Group by (sanitized) rule name, as rules sharing a name are saved to the same files.
+    retvs_by_name = {}
+    for retv in retvs:
+        name = retv["in"].get("name")
+        if isinstance(name, str) and name:
+            name = sanitize_identifier(name)
+
+        retvs_by_name.setdefault(name, []).append(retv)
+
+    # Save all the sources up front, rules sharing a name are saved to the same file (last one wins).
+    source_paths = {}
+    saveable_rules = []
+    for named_retvs in retvs_by_name.values():
+        try:
+            saveable_rules.append(YaraRule.from_dict(named_retvs[-1]["in"]))
+        except Exception:
+            # Leave it to create_yara_file to save (or fail on) the rule(s).
+            pass
+
+    if saveable_rules:
+        source_paths = dict(zip([rule.name for rule in saveable_rules], YaraRule.save_sources(saveable_rules)))
+
+    def create_yara_files(name, named_retvs: list):
+        source_path = source_paths.get(name)
+
+        for idx, named_retv in enumerate(named_retvs):
+            try:
+                named_retv["out"] = create_yara_file(named_retv["in"], source_path=source_path)
+
+                if source_path is not None and idx < len(named_retvs) - 1:
+                    # The saved source is that of the last rule sharing this name, not this one's.
+                    named_retv["out"].pop("source_path", None)
+            except Exception as create_yara_file_exc:
+                log.exception("Unexpected Exception occurred when creating YARA file!", exc_info=create_yara_file_exc)
+                named_retv["out"] = {
+                    "success": False,
+                    "compilable": False,
+                    "error": {
+                        "message": str(create_yara_file_exc),
+                        "type": "exception",
+                        "level": "error"
+                    }
+                }
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # Consume the (empty) results in order to propagate any unexpected exceptions.
+        list(executor.map(create_yara_files, retvs_by_name.keys(), retvs_by_name.values()))
+
+    # Reset invalid changed files to avoid git-within-git changelist issues.
+    for named_retvs in retvs_by_name.values():
+        # Rules sharing a name are saved to the same file, so only the last one that was saved determines
+        # whether it is invalid (resetting it for an earlier one would discard a later, valid rule).
+        saved_retvs = [named_retv for named_retv in named_retvs if "source_path" in named_retv["out"]]
+        if not saved_retvs:
+            continue
+
+        retv = saved_retvs[-1]
+        if not retv["out"]["success"] and not retv["out"]["compilable"]:
+            try:
+                reset_invalid_yara_rule(the_oracle_repo, retv["out"]["source_path"])
+            except git_handler.exc.CheckoutError as e:
+                log.warning("FAILED (exc: {exc_type}) Resetting invalid changed file "
+                            "to avoid git-within-git changelist issues.".format(exc_type=e.__class__.__name__),
+                            exc_info=e)
+
+    return retvs
@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 import time
 from datetime import datetime
@@ -13,7 +14,7 @@ from handlers.config_handler import CONFIG
 from handlers import git_handler
 from utils import list_keys
 from yara_toolkit.yara_meta import YaraMeta
-from yara_toolkit.yara_rule import YaraRule
+from yara_toolkit.yara_rule import YaraRule, ensure_rules_dir
 from yara_toolkit.yara_string import YaraString
 
 api = Namespace('theoracle', description='TheOracle YARA Rule Git repository.')
@@ -101,13 +102,14 @@ class RulesOracleRequest(Resource):
         """Returns all rules."""
         theoracle_rules_dir = os.path.join(CONFIG["theoracle_local_path"], CONFIG["theoracle_repo_rules_dir"])
         # Create rules sub-directory if not exists.
-        if not os.path.isdir(theoracle_rules_dir):
-            os.mkdir(theoracle_rules_dir)
+        ensure_rules_dir(theoracle_rules_dir)
         yara_files = os.listdir(theoracle_rules_dir)
         retv = jsonify({"files": yara_files})
-        log.info("HTTP GET '{route}' returning {num}x JSON{keys_list}:\n{js}".format(
-            route='/rules',
-            num=len(yara_files), keys_list=str(list_keys(yara_files)), js=json.dumps(retv.json, indent=4)))
+        # Avoid re-parsing and re-serializing the response unless it is actually logged.
+        if log.isEnabledFor(logging.INFO):
+            log.info("HTTP GET '{route}' returning {num}x JSON{keys_list}:\n{js}".format(
+                route='/rules',
+                num=len(yara_files), keys_list=str(list_keys(yara_files)), js=json.dumps(retv.json, indent=4)))
 
         return retv
 
@@ -165,8 +167,10 @@ class RuleRequest(Resource):
         filepath = os.path.join(theoracle_rules_dir, filename)
 
         retv = jsonify(get_rule(filepath))
-        log.info("GET '{route}/{id}' return JSON: {retv}".format(
-            route='/rule', id=id, retv=json.dumps(retv.json, indent=4)))
+        # Avoid re-parsing and re-serializing the response unless it is actually logged.
+        if log.isEnabledFor(logging.INFO):
+            log.info("GET '{route}/{id}' return JSON: {retv}".format(
+                route='/rule', id=id, retv=json.dumps(retv.json, indent=4)))
 
         return retv
 
@@ -1,12 +1,68 @@
-from sqlalchemy import create_engine
+import threading
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+
+DATABASE_URI = 'sqlite:///yara_rules.db'
+# Pooled connections are shared between (Flask) threads, and writers wait on locks instead of failing immediately.
+DATABASE_CONNECT_ARGS = {'check_same_thread': False, 'timeout': 30}
+DATABASE_PRAGMAS = ["journal_mode=WAL", "synchronous=NORMAL", "temp_store=MEMORY"]
+
+# Database engine, created on first use (see get_engine).
+engine = None
+engine_lock = threading.Lock()
+
+# Create a configured "Session" class (bound to the engine upon session creation).
+# Objects are not expired on commit, as that would make every subsequent attribute access reload them.
+Session = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Engine 'connect' event listener which applies DATABASE_PRAGMAS to new SQLite connections.
+
+    WAL journaling lets readers proceed while a write is in progress.
+
+    :param dbapi_connection:
+    :param connection_record:
+    :return:
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in DATABASE_PRAGMAS:
+        cursor.execute("PRAGMA {}".format(pragma))
+    cursor.close()
+
+
+def get_engine():
+    """
+    Returns the database engine, creating it on first use.
+
+    Deferring the creation keeps importing this package (and the models) free
+    until the database is actually initialized or queried.
+
+    :return:
+    """
+    global engine
+
+    if engine is None:
+        with engine_lock:
+            if engine is None:
+                # NB: SQLite file databases default to NullPool, which opens a new connection per checkout.
+                engine = create_engine(DATABASE_URI, connect_args=DATABASE_CONNECT_ARGS, poolclass=QueuePool)
+                event.listen(engine, 'connect', set_sqlite_pragmas)
+
+    return engine
+
+
+def create_session():
+    """Session factory which binds new sessions to the (lazily created) database engine."""
+    return Session(bind=get_engine())
 
-# Create a database engine.
-engine = create_engine('sqlite:///yara_rules.db')
 
-# Create a configured "Session" class.
-db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+# Thread-local session registry.
+db_session = scoped_session(create_session)
 
 # Returns a new base class from which all mapped classes should inherit.
 Base = declarative_base()
@@ -17,7 +73,7 @@ def init_db():
     # they will be registered properly on the metadata.  Otherwise
     # you will have to import them first before calling init_db()
     from database.models import YaraRuleDB, YaraTagDB, YaraStringDB, YaraStringModifierDB, YaraMetaDB
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 
 
@@ -1,9 +1,11 @@
 import json
+import logging
 
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload
 
 from database import db_session
-from database.models import YaraRuleDB, YARA_RULE_DB_RELATION_COLUMNS
+from database.models import YaraRuleDB, YaraStringDB, YARA_RULE_DB_RELATION_COLUMNS
 from handlers.log_handler import create_logger
 from utils import dict_to_json
 
@@ -146,13 +148,22 @@ def get_rules() -> list:
     session = db_session()
 
     try:
-        for rule in session.query(YaraRuleDB).all():
-            rules.append(rule.as_dict())
-            log.debug("get_rules rule '{title} {rcid}': dict{keys_list}:\n{js}".format(
-                rcid=rule.thehive_case_id,
-                title=rule.title,
-                keys_list=str((list(rule.as_dict().keys()))),
-                js=json.dumps(dict_to_json(rule.as_dict()), indent=4)))
+        # Eager load the relationships of all rules using one SELECT ... IN query per relationship.
+        query = session.query(YaraRuleDB).options(
+            selectinload(YaraRuleDB.tags),
+            selectinload(YaraRuleDB.meta),
+            selectinload(YaraRuleDB.strings).selectinload(YaraStringDB.modifiers))
+
+        for rule in query.all():
+            rule_dict = rule.as_dict()
+            rules.append(rule_dict)
+
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("get_rules rule '{title} {rcid}': dict{keys_list}:\n{js}".format(
+                    rcid=rule.thehive_case_id,
+                    title=rule.title,
+                    keys_list=str((list(rule_dict.keys()))),
+                    js=json.dumps(dict_to_json(rule_dict), indent=4)))
 
         # Commit transaction (NB: makes detached instances expire)
         session.commit()
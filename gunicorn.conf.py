@@ -0,0 +1,16 @@
+"""
+Gunicorn configuration, usage: `gunicorn -c gunicorn.conf.py wsgi:application`.
+
+Threaded (gthread) workers are used: yara-python releases the GIL while scanning (yara.Rules.match),
+so a worker keeps serving requests on its other threads while a match is in flight.
+"""
+import multiprocessing
+
+bind = "0.0.0.0:5001"
+workers = multiprocessing.cpu_count()
+worker_class = "gthread"
+threads = 4
+# Load the application once in the master, then fork the workers (copy-on-write).
+preload_app = True
+# Leave room for yara.Rules.match, which times out after 60 seconds (see YaraRule.from_compiled_file).
+timeout = 90
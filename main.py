@@ -1,7 +1,8 @@
 import json
+import logging
 from datetime import date
 
-from flask import Flask
+from flask import Flask, current_app
 from flask.json import JSONEncoder
 from flask_cors import CORS
 
@@ -10,7 +11,8 @@ from flask_helpers import ReverseProxied
 from handlers import config_handler
 from handlers.log_handler import create_logger
 from handlers import git_handler
-from database import init_db
+from database import init_db, db_session
+from yara_toolkit.yara_ruleset import RULESET
 
 log = create_logger(__name__)
 log_utility_functions = create_logger("{}.utility_functions".format(__name__))
@@ -55,8 +57,13 @@ def filter_suppress_none(val):
         return ''
 
 
+def shutdown_session(exception=None):
+    """Removes the (thread-local) database session at the end of each request/app context."""
+    db_session.remove()
+
+
 def get_flask_rule_by_name(name: str):
-    for r in app.url_map.iter_rules():
+    for r in current_app.url_map.iter_rules():
         if r.rule == name:
             return r
 
@@ -70,14 +77,22 @@ def log_added_route(name: str, include_obj=True):
         log.debug2(rule.__dict__)
 
 
-if __name__ == "__main__":
+def create_app():
+    """
+    Flask application factory.
+
+    Loads the configuration, initializes the database and TheOracle Git repository,
+    then sets up and returns the Flask app (see wsgi.py for running it under a WSGI server).
+
+    :return:
+    """
     # Get config.
     config = config_handler.load_config()
     log.info("Loaded configuration: '{}'.".format(
         config_handler.CONFIG_FILE if config_handler.has_custom_config() else 'default'))
-    log.debug("CONFIG (overrides: {overrides}):\n{js}".format(
-        overrides=config_handler.CONFIG_OVERRIDES,
-        js=json.dumps(config_handler.CONFIG, indent=4)))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("CONFIG (overrides: %s):\n%s",
+                  config_handler.CONFIG_OVERRIDES, json.dumps(config_handler.CONFIG, indent=4))
 
     # Initialize database.
     init_db()
@@ -86,13 +101,22 @@ if __name__ == "__main__":
     # Set up TheOracle Git.
     git_handler.clone_if_not_exist(url=config["theoracle_repo"], path=config["theoracle_local_path"])
 
+    # Compile all existing rules into the application wide ruleset.
+    RULESET.load_sources_dir()
+
     # Set up Flask.
     app = MyFlask(__name__)
     # Make Flask app support reverse proxy with sub-path.
     app.wsgi_app = ReverseProxied(app.wsgi_app)
+    # Skip sorting keys and pretty printing when serializing JSON responses, neither is needed by API consumers.
+    app.config["JSON_SORT_KEYS"] = False
+    app.config["JSONIFY_PRETTYPRINT_REGULAR"] = False
     log.info("Configured Flask app.")
     CORS(app)
 
+    # Clean up database sessions when the app context tears down.
+    app.teardown_appcontext(shutdown_session)
+
     # Add utility functions like print_in_console ('mdebug' in Jinja2 code)
     app.context_processor(utility_functions)
     log.info("Added Flask app context processor utility functions: {}.".format(
@@ -105,8 +129,14 @@ if __name__ == "__main__":
     # Set up Flask-RESTX (API).
     app.register_blueprint(api, url_prefix='/api/v1')
 
-    # Run the Flask Webserver.
+    return app
+
+
+if __name__ == "__main__":
+    app = create_app()
+    config = config_handler.CONFIG
+
+    # Run the Flask (development) Webserver, use a WSGI server (see wsgi.py) in production.
     log.info("Starting Flask App Webserver, listening on: {host}:{port}".format(
         host=config["listener_bind_host"], port=config["listener_bind_port"]))
-    app.run(host=config["listener_bind_host"], port=config["listener_bind_port"], debug=True)
-
+    app.run(host=config["listener_bind_host"], port=config["listener_bind_port"], debug=config["debug"])
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from apis import handling
+from yara_toolkit.yara_rule import RULES_DIR
+
+
+def yara_rule_dict(name, condition):
+    return {"name": name, "tags": [], "meta": [], "strings": [], "condition": condition}
+
+
+class TestGenerateYaraRules(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        # RULES_DIR is relative, so work in a temporary directory.
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        os.makedirs(RULES_DIR)
+
+        patchers = [
+            mock.patch.object(handling.git_handler, "clone_if_not_exist"),
+            mock.patch.object(handling, "RULESET"),
+            # Stand-in for checking out the (untracked) file.
+            mock.patch.object(handling, "reset_invalid_yara_rule",
+                              side_effect=lambda repo, filepath: os.remove(filepath))
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_duplicate_names_later_valid_rule_kept(self):
+        """An earlier invalid rule sharing its name with a later valid one doesn't reset the valid one's file."""
+        retvs = handling.generate_yara_rules([yara_rule_dict("dup", "true and bogus"),
+                                              yara_rule_dict("dup", "true")])
+
+        self.assertFalse(retvs[0]["out"]["success"])
+        self.assertTrue(retvs[1]["out"]["success"])
+        handling.reset_invalid_yara_rule.assert_not_called()
+
+        with open(retvs[1]["out"]["source_path"], 'r') as f:
+            self.assertEqual(f.read(), retvs[1]["out"]["source_code"])
+
+    def test_sanitized_duplicate_names(self):
+        """Names which sanitize to the same identifier are treated as duplicates (as they share a file)."""
+        retvs = handling.generate_yara_rules([yara_rule_dict("dup rule", "true"),
+                                              yara_rule_dict("dup_rule", "true and bogus")])
+
+        self.assertNotIn("source_path", retvs[0]["out"])
+        self.assertFalse(retvs[1]["out"]["success"])
+        handling.reset_invalid_yara_rule.assert_called_once_with(mock.ANY, retvs[1]["out"]["source_path"])
+
+    def test_duplicate_names_source_path(self):
+        """Only the last rule sharing a name (whose source is the one saved) reports a source path."""
+        retvs = handling.generate_yara_rules([yara_rule_dict("dup", "false"),
+                                              yara_rule_dict("dup", "true")])
+
+        self.assertNotIn("source_path", retvs[0]["out"])
+
+        with open(retvs[1]["out"]["source_path"], 'r') as f:
+            self.assertEqual(f.read(), retvs[1]["out"]["source_code"])
+
+    def test_duplicate_names_later_invalid_rule_reset(self):
+        """A later invalid rule sharing its name with an earlier valid one resets the file."""
+        retvs = handling.generate_yara_rules([yara_rule_dict("dup", "true"),
+                                              yara_rule_dict("dup", "true and bogus")])
+
+        self.assertFalse(retvs[1]["out"]["success"])
+        handling.reset_invalid_yara_rule.assert_called_once_with(mock.ANY, retvs[1]["out"]["source_path"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,11 @@
 import unittest
 
+import yara
+
 from yara_toolkit.utils import delimiter_wrap_type, STRING_TYPE_DELIMITERS, \
     TEXT_TYPE, HEX_TYPE, REGEX_TYPE, INT_TYPE, BOOL_TYPE, \
     TEXT_DELIMITER_START, TEXT_DELIMITER_END, HEX_DELIMITER_START, HEX_DELIMITER_END, \
-    REGEX_DELIMITER_START, REGEX_DELIMITER_END
+    REGEX_DELIMITER_START, REGEX_DELIMITER_END, is_hex_esc_sequence, decode_string_value
 
 
 class TestYaraUtilsDelimiterWrapType(unittest.TestCase):
@@ -41,5 +43,46 @@ class TestYaraUtilsDelimiterWrapType(unittest.TestCase):
             self.fail("{}".format(exc))
 
 
+class TestYaraUtilsIsHexEscSequence(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_hex_digits(self):
+        """Hex escape sequences with both decimal and (either case) letter hex digits"""
+        for test in ["\\x00", "\\x4D", "\\xff"]:
+            self.assertTrue(is_hex_esc_sequence(test), test)
+
+    def test_not_hex(self):
+        """Non-hex digits, too short or surrounded by other chars"""
+        for test in ["\\xg0", "\\x4", "a\\x41", "\\x411", "\\n"]:
+            self.assertFalse(is_hex_esc_sequence(test), test)
+
+
+class TestYaraUtilsDecodeStringValue(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_utf8(self):
+        """Valid UTF-8 decodes as-is"""
+        self.assertEqual(decode_string_value("Blåbær".encode('utf-8')), "Blåbær")
+
+    def test_non_utf8(self):
+        """Non-UTF-8 bytes become hex escape sequences instead of raising"""
+        self.assertEqual(decode_string_value(b"MZ\x90\xff"), "MZ\\x90\\xff")
+
+    def test_escapes(self):
+        """Backslashes, quotes and control characters are escaped, keeping distinct data distinct"""
+        self.assertEqual(decode_string_value(b'a\\b"c'), 'a\\\\b\\"c')
+        self.assertEqual(decode_string_value(b"\x00\t\n\r\x7f"), "\\x00\\t\\n\\r\\x7f")
+        self.assertNotEqual(decode_string_value(b"\\x90"), decode_string_value(b"\x90"))
+
+    def test_renders_same_data(self):
+        """The decoded value, as a YARA text string, matches the original data"""
+        data = b'MZ\x90\x00\\"\n\xe2\x82\xac'
+        rule = yara.compile(source='rule r {{ strings: $a = "{}" condition: $a }}'.format(decode_string_value(data)))
+
+        self.assertTrue(rule.match(data=b"xx" + data + b"xx"))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+
+from yara_toolkit.yara_condition import YaraCondition
+from yara_toolkit.yara_rule import YaraRule, YaraRuleSyntaxError, RULES_DIR, COMPILED_FILE_EXTENSION
+from yara_toolkit.yara_string import YaraString
+
+
+class TestYaraRuleReferencedStrings(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_unreferenced_string_omitted(self):
+        """Strings not referenced in the condition are rinsed out."""
+        rule = YaraRule("test_rule",
+                        strings=[YaraString("s1", "abc"), YaraString("s2", "def")],
+                        condition="$s1")
+
+        self.assertEqual([ys.identifier for ys in rule.get_referenced_strings()], ["s1"])
+
+    def test_enclosed_references(self):
+        """References enclosed in parentheses or using count/offset symbols are detected."""
+        rule = YaraRule("test_rule",
+                        strings=[YaraString("s1", "abc"), YaraString("s2", "def"), YaraString("s3", "ghi")],
+                        condition="($s1 or #s2 > 2) and @s1[1] < 100")
+
+        self.assertEqual([ys.identifier for ys in rule.get_referenced_strings()], ["s1", "s2"])
+
+    def test_wildcard_references(self):
+        """Wildcards reference every string starting with the prefix, and "them" references all strings."""
+        strings = [YaraString("a1", "abc"), YaraString("a2", "def"), YaraString("b1", "ghi")]
+
+        for condition, expected in [("any of ($a*)", ["a1", "a2"]),
+                                    ("all of ($*)", ["a1", "a2", "b1"]),
+                                    ("any of them", ["a1", "a2", "b1"])]:
+            rule = YaraRule("test_rule", strings=strings, condition=condition)
+
+            self.assertEqual([ys.identifier for ys in rule.get_referenced_strings()], expected, condition)
+            rule.compile(validate_only=True)
+
+    def test_no_condition(self):
+        """Without a condition no strings are referenced (and the rule still renders)."""
+        rule = YaraRule("test_rule", strings=[YaraString("s1", "abc")])
+
+        self.assertEqual(rule.get_referenced_strings(), [])
+        self.assertIsNone(rule.determine_errored_word_index('line 5: undefined identifier "bogus"'))
+        str(rule)
+
+    def test_condition_reassignment_invalidates(self):
+        """Reassigning the condition invalidates the cached referenced strings."""
+        rule = YaraRule("test_rule",
+                        strings=[YaraString("s1", "abc"), YaraString("s2", "def")],
+                        condition="$s1")
+        self.assertEqual([ys.identifier for ys in rule.get_referenced_strings()], ["s1"])
+
+        rule.condition = YaraCondition("$s2")
+
+        self.assertEqual([ys.identifier for ys in rule.get_referenced_strings()], ["s2"])
+
+
+class TestYaraRuleSyntaxErrorColumn(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_column_of_words(self):
+        """Columns are the (1-indexed) position of the errored word on the indented condition line."""
+        rule = YaraRule("test_rule", condition="$s1 and bogus")
+
+        first = rule.determine_syntax_error_column(None, line_number=5, splitline_number=5, raise_exc=False)
+        last = rule.determine_syntax_error_column(None, line_number=5, splitline_number=7, raise_exc=False)
+
+        self.assertEqual(first, {"column_number": "9", "column_range": "12", "word": "$s1"})
+        self.assertEqual(last, {"column_number": "17", "column_range": "22", "word": "bogus"})
+
+    def test_compile_locates_errored_word(self):
+        """The errored word is located by the token quoted in the yara.SyntaxError message."""
+        rule = YaraRule("test_rule", condition="true and bogus")
+
+        with self.assertRaises(YaraRuleSyntaxError) as ctx:
+            rule.compile(save_file=False)
+
+        self.assertEqual(ctx.exception.word, "bogus")
+        self.assertEqual(ctx.exception.column_number, "18")
+
+    def test_errored_word_index(self):
+        """The errored word is the quoted token (or a module member of it), else it's unknown."""
+        rule = YaraRule("test_rule", condition="bogus_ident and pe.number_of_sections and bogus")
+
+        self.assertEqual(rule.determine_errored_word_index('line 5: undefined identifier "bogus"'), 4)
+        self.assertEqual(rule.determine_errored_word_index('line 5: undefined identifier "pe"'), 2)
+        self.assertIsNone(rule.determine_errored_word_index('line 5: undefined identifier "other"'))
+        self.assertIsNone(rule.determine_errored_word_index('line 5: syntax error, unexpected <and>'))
+
+    def test_compile_empty_condition(self):
+        """An empty condition is reported as a syntax error (pointing at the start of the condition)."""
+        rule = YaraRule("test_rule", condition="")
+
+        with self.assertRaises(YaraRuleSyntaxError) as ctx:
+            rule.compile(save_file=False)
+
+        self.assertEqual(ctx.exception.word, "")
+        self.assertEqual(ctx.exception.column_number, "9")
+
+    def test_compile_validate_only(self):
+        """Validating neither sets compiled_blob nor saves any file, but still raises on syntax errors."""
+        rule = YaraRule("test_rule_validate_only", condition="true")
+
+        rule.compile(validate_only=True)
+
+        self.assertIsNone(rule.compiled_blob)
+        self.assertIsNone(rule.compiled_path)
+        self.assertFalse(os.path.exists(os.path.join(RULES_DIR, rule.name + COMPILED_FILE_EXTENSION)))
+
+        with self.assertRaises(YaraRuleSyntaxError):
+            YaraRule("test_rule_validate_only", condition="true and bogus").compile(validate_only=True)
+
+
+class TestYaraRuleSaveSources(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_save_sources(self):
+        """Each rule's source is saved to a file named after it, in the given order."""
+        rules = [YaraRule("rule_a", condition="true"), YaraRule("rule_b", condition="false")]
+
+        with tempfile.TemporaryDirectory() as rules_dir:
+            filepaths = YaraRule.save_sources(rules, rules_dir=os.path.join(rules_dir, "rules"))
+
+            self.assertEqual([os.path.basename(fp) for fp in filepaths], ["rule_a.yar", "rule_b.yar"])
+
+            for rule, filepath in zip(rules, filepaths):
+                with open(filepath, 'r') as f:
+                    self.assertEqual(f.read(), str(rule))
+
+
+class TestYaraRuleCompileMany(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_compile_many(self):
+        """Rules are compiled into a single yara.Rules, each rule in its own namespace unless set."""
+        rules = [YaraRule("rule_a", strings=[YaraString("s1", "abc")], condition="$s1"),
+                 YaraRule("rule_b", strings=[YaraString("s1", "def")], condition="$s1"),
+                 YaraRule("rule_c", strings=[YaraString("s1", "ghi")], condition="$s1", namespace="rule_b")]
+
+        matches = YaraRule.compile_many(rules).match(data="abc def ghi")
+
+        self.assertEqual(sorted((m.namespace, m.rule) for m in matches),
+                         [("rule_a", "rule_a"), ("rule_b", "rule_b"), ("rule_b", "rule_c")])
+
+
+if __name__ == '__main__':
+    unittest.main()
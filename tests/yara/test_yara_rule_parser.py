@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from yara_toolkit.yara_rule import YaraRule
+from yara_toolkit.yara_meta import YaraMeta
+from yara_toolkit.yara_string import YaraString
+
+BODY = '''
+    meta:
+        description = "has strings: and // no comment"
+    strings:
+        $a = "x\\"y:" // comment with strings: and a "quote
+        $b = /ab\\/c:/i /* comment block
+           condition: */
+        $c = { 4D 5A [2] ?? }
+    condition:
+        $a or $b or $c
+'''
+
+
+class TestYaraRuleParser(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_abstract_source_body_preserves_indices(self):
+        """The string safe body has the same length (and lines) as the body, with keywords at the same indices."""
+        string_safe_body = YaraRule.abstract_source_body(BODY)
+
+        self.assertEqual(len(string_safe_body), len(BODY))
+        self.assertEqual(string_safe_body.count('\n'), BODY.count('\n'))
+
+        for keyword in ["meta:", "strings:", "condition:"]:
+            self.assertEqual(string_safe_body.count(keyword), 1)
+            self.assertEqual(BODY[string_safe_body.find(keyword):].find(keyword), 0)
+
+    def test_abstract_source_body_placeholders(self):
+        """Strings, regexes, hex strings and comments are replaced with their respective placeholders."""
+        string_safe_body = YaraRule.abstract_source_body(BODY)
+
+        self.assertIn('$a = ####### @@@', string_safe_body)
+        self.assertIn('$b = ~~~~~~~~i %%', string_safe_body)
+        self.assertIn('$c = ¤¤¤¤¤¤¤¤¤¤¤¤¤¤¤¤\n', string_safe_body)
+
+    def test_parse_strings_body_skips_comments(self):
+        """Comments are skipped, but comment-like contents of strings and regexes are kept."""
+        strings_body = '''
+        $a = "x // y" wide // comment with a $fake = "string"
+        /* comment block
+           $fake2 = "string" */
+        $b = /a\\/\\/b/ nocase
+'''
+        strings = YaraRule.parse_strings_body(strings_body)
+
+        self.assertEqual([(s["identifier"], s["value"], s["string_type"]) for s in strings],
+                         [("a", "x // y", "text"), ("b", "a\\/\\/b", "regex")])
+        self.assertEqual([m["keyword"] for m in strings[0]["modifiers"]], ["wide"])
+
+    def test_from_source_code_round_trip(self):
+        """Parsing the source of a rule yields the same rule (source)."""
+        rule = YaraRule("test_rule", tags=["tag1"],
+                        meta=[YaraMeta("description", "has strings: and // no comment", str)],
+                        strings=[YaraString("s1", "abc"), YaraString("s2", "de:f")],
+                        condition="$s1 and $s2")
+
+        self.assertEqual(str(YaraRule.from_source_code(str(rule))), str(rule))
+
+    def test_legacy_yara_python_parser_source_file(self):
+        """Source files that aren't UTF-8 are parsed, and includes are resolved relative to the file."""
+        with tempfile.TemporaryDirectory() as rules_dir:
+            with open(os.path.join(rules_dir, "included.yar"), 'w') as f:
+                f.write("rule included_rule { condition: false }\n")
+
+            source_path = os.path.join(rules_dir, "test_rule.yar")
+            with open(source_path, 'wb') as f:
+                f.write(b'include "included.yar"\n'
+                        b'// Latin-1 comment: \xe6\xf8\xe5\n'
+                        b'rule test_rule\n{\n    condition:\n        true\n}\n')
+
+            rule = YaraRule._legacy_from_source_file_yara_python(source_path)
+
+        self.assertEqual(rule.name, "test_rule")
+        self.assertEqual(str(rule.condition), "true")
+
+
+if __name__ == '__main__':
+    unittest.main()
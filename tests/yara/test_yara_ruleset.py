@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import yara
+
+from yara_toolkit.yara_rule import YaraRule
+from yara_toolkit.yara_ruleset import YaraRuleSet
+from yara_toolkit.yara_string import YaraString
+
+
+class TestYaraRuleSet(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def test_match_combined_rules(self):
+        """Rules added to the set are compiled together and all take part in matching."""
+        ruleset = YaraRuleSet()
+        ruleset.add(YaraRule("rule_abc", strings=[YaraString("s1", "abc")], condition="$s1"))
+        ruleset.add(YaraRule("rule_def", strings=[YaraString("s1", "def")], condition="$s1"))
+
+        self.assertEqual(sorted(m.rule for m in ruleset.match(data="xx abc def xx")), ["rule_abc", "rule_def"])
+        self.assertEqual([m.rule for m in ruleset.match(data="xx def xx")], ["rule_def"])
+
+    def test_uncompilable_rule_left_out(self):
+        """A rule which doesn't compile doesn't take the rest of the set down with it."""
+        ruleset = YaraRuleSet()
+        ruleset.add(YaraRule("rule_abc", strings=[YaraString("s1", "abc")], condition="$s1"))
+        ruleset.add_source("rule_broken", "rule rule_broken { condition: $undefined }")
+
+        self.assertEqual([m.rule for m in ruleset.match(data="abc")], ["rule_abc"])
+
+    def test_uncompilable_rule_compiled_once(self):
+        """Rebuilds leave a known uncompilable rule out up front, instead of compiling every rule on its own again."""
+        ruleset = YaraRuleSet()
+        ruleset.add_source("rule_broken", "rule rule_broken { condition: $undefined }")
+        ruleset.add(YaraRule("rule_abc", strings=[YaraString("s1", "abc")], condition="$s1"))
+        ruleset.rebuild()
+
+        ruleset.add(YaraRule("rule_def", strings=[YaraString("s1", "def")], condition="$s1"))
+        with mock.patch("yara_toolkit.yara_ruleset.yara.compile", wraps=yara.compile) as compile_mock:
+            ruleset.rebuild()
+
+        self.assertEqual(compile_mock.call_count, 1)
+        self.assertEqual([m.rule for m in ruleset.match(data="def")], ["rule_def"])
+
+    def test_sync_sources_dir(self):
+        """Rules saved to the sources directory (e.g. by another process) are added, changed and removed."""
+        with tempfile.TemporaryDirectory() as rules_dir:
+            ruleset = YaraRuleSet(sync_interval=0)
+            ruleset.load_sources_dir(rules_dir)
+            self.assertEqual(ruleset.match(data="abc"), [])
+
+            rule = YaraRule("rule_abc", strings=[YaraString("s1", "abc")], condition="$s1")
+            filepath = rule.save_source(rules_dir=rules_dir)
+            self.assertEqual([m.rule for m in ruleset.match(data="abc")], ["rule_abc"])
+
+            rule.strings = [YaraString("s1", "def")]
+            rule.save_source(rules_dir=rules_dir)
+            # Make sure the change is noticed, regardless of the filesystem's timestamp granularity.
+            os.utime(filepath, ns=(0, 0))
+            self.assertEqual(ruleset.match(data="abc"), [])
+            self.assertEqual([m.rule for m in ruleset.match(data="def")], ["rule_abc"])
+
+            os.remove(filepath)
+            self.assertEqual(ruleset.match(data="def"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for running the YARA-Designer core/backend under a production WSGI server,
+e.g. uWSGI: `uwsgi --ini uwsgi.ini`.
+"""
+from database import get_engine
+from main import create_app
+
+application = create_app()
+
+# Don't hand pooled database connections down to forked workers, they'll open their own.
+get_engine().dispose()
@@ -1,5 +1,7 @@
+import hashlib
 import json
 import re
+from functools import lru_cache
 
 # YARA String types
 from handlers.log_handler import create_logger
@@ -46,6 +48,22 @@ STRING_TYPE_DELIMITERS = {
 SOURCE_FILE_EXTENSION = ".yar"
 COMPILED_FILE_EXTENSION = ".bin"
 
+# Size (in bytes) of source digests, see source_digest.
+SOURCE_DIGEST_SIZE = 16
+
+# Number of (distinct) identifiers to memoize sanitization of, identifiers repeat heavily across rules.
+SANITIZE_IDENTIFIER_CACHE_SIZE = 8192
+
+# Identifiers that are already valid (i.e. not starting with a digit, only consisting of word characters).
+VALID_IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_]\w*")
+# Hex escape sequences, e.g. \x4D.
+HEX_ESC_SEQUENCE_PATTERN = re.compile(r"^\\x[0-9a-fA-F]{2}$")
+# Non-word characters and spaces.
+INVALID_IDENTIFIER_CHARS_PATTERN = re.compile(r"([^\w\s+]|[^\w\S+])")
+# Escape sequences of control characters in YARA text strings (\t, \n and \r, else hex escape sequences).
+TEXT_STRING_CONTROL_CHAR_ESCAPES = {c: "\\x{:02x}".format(c) for c in list(range(0x20)) + [0x7f]}
+TEXT_STRING_CONTROL_CHAR_ESCAPES.update({ord('\t'): "\\t", ord('\n'): "\\n", ord('\r'): "\\r"})
+
 log = create_logger(__name__)
 
 
@@ -84,6 +102,7 @@ def is_number(s: str) -> bool:
         return False
 
 
+@lru_cache(maxsize=SANITIZE_IDENTIFIER_CACHE_SIZE)
 def sanitize_identifier(identifier: str) -> str:
     """
     Identifiers must follow the same lexical conventions of the C programming language,
@@ -91,9 +110,15 @@ def sanitize_identifier(identifier: str) -> str:
     first character can not be a digit. Rule identifiers are case sensitive and cannot
     exceed 128 characters.
 
+    NB: Results are memoized, as the same identifiers get sanitized over and over (tags, meta, strings etc.).
+
     :param identifier:
     :return:
     """
+    # Most identifiers are already valid, in which case there's nothing to sanitize.
+    if VALID_IDENTIFIER_PATTERN.fullmatch(identifier):
+        return identifier
+
     if is_number(identifier[0]):
         # If the first character is a digit, prepend an underscore as
         # the first character can not be a digit.
@@ -103,7 +128,7 @@ def sanitize_identifier(identifier: str) -> str:
         identifier = identifier[1:]
 
     # Replace all non-word characters and spaces (everything except numbers and letters) with underscore.
-    s = re.sub(r"([^\w\s+]|[^\w\S+])", '_', identifier)
+    s = INVALID_IDENTIFIER_CHARS_PATTERN.sub('_', identifier)
 
     return s
 
@@ -185,9 +210,32 @@ def determine_value_type(v):
 
 def is_hex_esc_sequence(s):
     """Takes a string 's' and determines if it is a hex escape sequence."""
-    p = re.compile(r"^\\x[0-9][0-9]$")
-    m = p.match(s)
-    if m:
-        return True
-    else:
-        return False
\ No newline at end of file
+    return HEX_ESC_SEQUENCE_PATTERN.match(s) is not None
+
+
+def source_digest(source: str) -> bytes:
+    """
+    Returns a digest of (YARA) source code, for use as cache key.
+
+    Uses BLAKE2b, which is implemented in C (unlike checksumming in Python) and has a fast path for small inputs.
+
+    :param source:
+    :return:
+    """
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=SOURCE_DIGEST_SIZE).digest()
+
+
+def decode_string_value(value: bytes) -> str:
+    """
+    Decodes (matched) YARA string data as UTF-8 into the contents of a YARA text string.
+
+    Backslashes and double quotes are escaped, and control characters and non-UTF-8 bytes are replaced
+    with escape sequences, so that the result renders (see YaraString) back into the same data.
+
+    :param value:
+    :return:
+    """
+    # Escape the escape char (and quotes) first, so that escape sequences added by decoding are unambiguous.
+    value = value.replace(b'\\', b'\\\\').replace(b'"', b'\\"')
+
+    return value.decode('utf-8', 'backslashreplace').translate(TEXT_STRING_CONTROL_CHAR_ESCAPES)
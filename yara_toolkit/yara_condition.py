@@ -1,14 +1,21 @@
+from itertools import accumulate
 from typing import Union, List
 
 SEPARATORS = [' ', '\n', '\t']
 YARA_VAR_SYMBOL = "$"
+# Trailing wildcard of a string reference (e.g. $a* or $*).
+YARA_VAR_WILDCARD = '*'
 OPERATORS = ["==", '<', '>', "<=", ">=", "!=", '+', '-', '*', '/', '%', '\\', '&', '|', '~', "<<", ">>", '(', ')']
 SINGLE_CHAR_OPERATORS = ['<', '>', '+', '-', '*', '/', '%', '\\', '&', '|', '~', '(', ')']
 MULTI_CHAR_OPERATORS = ["==", "<=", ">=", "!=", "<<", ">>"]
+# Characters that may start a multi-char operator.
+MULTI_CHAR_OPERATOR_STARTS = {x[0] for x in MULTI_CHAR_OPERATORS}
 
 
 class YaraCondition:
     def __init__(self, values: Union[str, List] = None):
+        self._word_offsets = None
+
         if isinstance(values, list):
             self.values = values
         elif isinstance(values, str):
@@ -52,10 +59,14 @@ class YaraCondition:
                         # Update values list and (implicitly) clear value_str.
                         value_str = update_str(self.values, value_str)
                         pending = False
-                elif values[i] in [x[0] for x in MULTI_CHAR_OPERATORS]:
+                elif values[i] in MULTI_CHAR_OPERATOR_STARTS:
                     inside_possible_multichar_operator = True
                     value_str += values[i]
                     pending = True
+                elif values[i] == YARA_VAR_WILDCARD and value_str.startswith(YARA_VAR_SYMBOL):
+                    # Wildcard string reference, not a multiplication.
+                    value_str += values[i]
+                    pending = True
                 elif values[i] in SINGLE_CHAR_OPERATORS:
                     if pending:
                         # Add pending string to list before starting on operator string
@@ -76,6 +87,27 @@ class YaraCondition:
         else:
             raise ValueError("Values must be either string or list, got '{}'!".format(type(values)))
 
+    def __setattr__(self, key, value):
+        super().__setattr__(key, value)
+
+        if key == "values":
+            # Offsets are derived from values, invalidate them.
+            super().__setattr__("_word_offsets", None)
+
+    def word_offsets(self) -> List[int]:
+        """
+        Returns the char offset of each value (word) in the condition string (see __str__).
+
+        The offsets are cached until values is reassigned.
+        NB: In-place modifications of the values list are not tracked.
+
+        :return: List of offsets, with an additional trailing offset (length of the condition string + 1).
+        """
+        if self._word_offsets is None:
+            self._word_offsets = [0] + list(accumulate(len(value) + 1 for value in self.values))
+
+        return self._word_offsets
+
     def __str__(self):
         return ' '.join(self.values)
 
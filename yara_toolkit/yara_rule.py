@@ -1,16 +1,20 @@
-import copy
 import json
+import logging
 import os
 import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, Iterable, List, Tuple, Union
 
 import yara
 from yara import WarningError as YaraWarningError
 from yara import TimeoutError as YaraTimeoutError
 
 from handlers.log_handler import create_logger
-from yara_toolkit.utils import sanitize_identifier, determine_value_type, is_hex_esc_sequence
+from yara_toolkit.utils import sanitize_identifier, determine_value_type, is_hex_esc_sequence, source_digest, \
+    decode_string_value
 from yara_toolkit.yara_condition import YaraCondition
 from yara_toolkit.yara_meta import YaraMeta
 from yara_toolkit.yara_string import YaraString, TEXT_TYPE, HEX_TYPE, REGEX_TYPE, VALID_MOD_KEYWORDS, MODS_WITH_PAYLOAD, \
@@ -23,15 +27,155 @@ log = create_logger(__name__)
 INVALID_IDENTIFIERS = [].extend(KEYWORDS)  # FIXME: Implement validity check against reserved kw.
 
 YARA_VAR_SYMBOL = "$"
-CONDITION_INDENT_LENGTH = 8
+# Matches string references in a condition ($var, #count, @offset, !length), capturing the identifier
+# (including any trailing wildcard, e.g. $a* and $*).
+CONDITION_VAR_PATTERN = re.compile(r"[$#@!](\w*\*?)")
+# Condition keyword referencing all strings (e.g. "any of them").
+CONDITION_ALL_STRINGS_KEYWORD = "them"
+# Matches a rule's constructor line (name and tags) and its body.
+RULE_CONSTRUCTOR_PATTERN = re.compile(
+    r"(?P<rule_keyword>rule)\s+(?P<rule_identifier>\w+)\s*"
+    r"(?P<tag_body>(?P<tag_delimiter>:)\s*(?P<tags>[\s+\w]+))?\{(?P<rule_body>.*)\}",
+    re.MULTILINE | re.DOTALL)
+# Matches the items (identifier = value) of a meta body.
+META_ITEM_PATTERN = re.compile(
+    r"\s*(?P<full>(?P<identifier>\w+)\s*=\s*(?P<value>\".*\"|true|false|[0-9]*)).*",
+    re.MULTILINE)
+# Matches the condition section of a rule, capturing the (first line of the) condition.
+CONDITION_SECTION_PATTERN = re.compile(r"^[ \t]*condition[ \t]*:\s*([^\n]+)", re.MULTILINE | re.IGNORECASE)
+# Matches YARA compiler error/warning messages, capturing line number and reason.
+YARA_ERROR_PATTERN = re.compile(r"line (\d+): (.*)", re.DOTALL)
+# Offending token quoted in a yara.SyntaxError message, e.g. 'undefined identifier "bogus"'.
+YARA_ERROR_TOKEN_PATTERN = re.compile(r'"([^"]+)"')
+INDENT = 4 * " "
+INDENT2 = 2 * INDENT
+CONDITION_INDENT_LENGTH = len(INDENT2)
 SOURCE_FILE_EXTENSION = ".yar"
 COMPILED_FILE_EXTENSION = ".bin"
+# Sidecar file (next to the compiled file) holding the digest of the source it was compiled from.
+COMPILED_DIGEST_FILE_EXTENSION = ".digest"
+SAVE_SOURCES_BUFFER_SIZE = 1 << 16
 RULES_DIR = os.path.join(CONFIG["theoracle_local_path"], CONFIG["theoracle_repo_rules_dir"])
 STRING_PLACEHOLDER = "#"
 REGEX_PLACEHOLDER = "~"
 HEXADECIMAL_PLACEHOLDER = "¤"
 COMMENT_LINE_PLACEHOLDER = "@"
 COMMENT_BLOCK_PLACEHOLDER = "%"
+# Matches the tokens of a rule body that are replaced with placeholders (see YaraRule.abstract_source_body):
+# comment lines, comment blocks, quoted strings, regex strings and hex strings.
+SOURCE_BODY_TOKEN_PATTERN = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|/(?:\\.|[^\\/\n])+/|\{[^}]*\}', re.DOTALL)
+# Comment block chars that are kept as-is, in order to keep the lines (and words) of the body intact.
+COMMENT_BLOCK_CHARS_NOT_TO_REPLACE = {' ', '\n', '\t', '\r', '\b', '\f'}
+# YaraRule attributes that make up the rendered source, (re)assigning any of them invalidates the cached source.
+RENDERED_ATTRIBUTES = ["name", "tags", "meta", "strings", "condition"]
+
+# LRU cache of compiled yara.Rules objects, keyed by a digest of the rendered source (and compile flags).
+COMPILED_RULES_CACHE_MAX_ENTRIES = 256
+COMPILED_RULES_CACHE = OrderedDict()
+COMPILED_RULES_CACHE_LOCK = threading.Lock()
+
+
+def join_namespaced_sources(namespaced_sources: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    Concatenates sources by namespace, for compiling them together with yara.compile(sources=...).
+
+    :param namespaced_sources:  (namespace, source) tuples.
+    :return:                    Dict on the form of {namespace: source}.
+    """
+    sources_by_namespace = {}
+    for namespace, source in namespaced_sources:
+        sources_by_namespace.setdefault(namespace, []).append(source)
+
+    return {namespace: "\n".join(sources) for namespace, sources in sources_by_namespace.items()}
+
+
+@lru_cache(maxsize=None)
+def ensure_rules_dir(rules_dir: str) -> str:
+    """
+    Creates the rules directory if it does not exist.
+
+    Only done once per directory (and process), sparing every save the filesystem round-trip.
+
+    :param rules_dir:
+    :return: rules_dir
+    """
+    Path(rules_dir).mkdir(parents=True, exist_ok=True)
+
+    return rules_dir
+
+
+def get_cached_compiled_rules(key: bytes) -> Union[yara.Rules, None]:
+    """
+    Looks up a compiled yara.Rules object in the compiled rules cache.
+
+    :param key: Cache key (see YaraRule.compile).
+    :return:    yara.Rules object if cached, else None.
+    """
+    with COMPILED_RULES_CACHE_LOCK:
+        compiled_blob = COMPILED_RULES_CACHE.get(key)
+
+        if compiled_blob is not None:
+            # Mark as most recently used.
+            COMPILED_RULES_CACHE.move_to_end(key)
+
+        return compiled_blob
+
+
+def cache_compiled_rules(key: bytes, compiled_blob: yara.Rules):
+    """
+    Stores a compiled yara.Rules object in the compiled rules cache,
+    evicting the least recently used entry if the cache is full.
+
+    :param key:             Cache key (see YaraRule.compile).
+    :param compiled_blob:   yara.Rules object.
+    :return:
+    """
+    with COMPILED_RULES_CACHE_LOCK:
+        COMPILED_RULES_CACHE[key] = compiled_blob
+        COMPILED_RULES_CACHE.move_to_end(key)
+
+        if len(COMPILED_RULES_CACHE) > COMPILED_RULES_CACHE_MAX_ENTRIES:
+            COMPILED_RULES_CACHE.popitem(last=False)
+
+
+def abstract_source_body_token(token_match) -> str:
+    """
+    Returns the placeholder replacement for a SOURCE_BODY_TOKEN_PATTERN match, of the same length as the token.
+
+    :param token_match:
+    :return:
+    """
+    token = token_match.group()
+
+    if token.startswith("//"):
+        return COMMENT_LINE_PLACEHOLDER * len(token)
+    elif token.startswith("/*"):
+        return "".join(c if c in COMMENT_BLOCK_CHARS_NOT_TO_REPLACE else COMMENT_BLOCK_PLACEHOLDER for c in token)
+    elif token.startswith('"'):
+        return STRING_PLACEHOLDER * len(token)
+    elif token.startswith('/'):
+        return REGEX_PLACEHOLDER * len(token)
+    else:
+        return HEXADECIMAL_PLACEHOLDER * len(token)
+
+
+def blank_comment_token(token_match) -> str:
+    """
+    Returns the replacement for a SOURCE_BODY_TOKEN_PATTERN match with comments blanked out (same length),
+    strings, regexes and hex strings are returned as-is.
+
+    :param token_match:
+    :return:
+    """
+    token = token_match.group()
+
+    if token.startswith("//"):
+        return ' ' * len(token)
+    elif token.startswith("/*"):
+        return "".join(c if c in COMMENT_BLOCK_CHARS_NOT_TO_REPLACE else ' ' for c in token)
+    else:
+        return token
 
 
 class YaraRuleSyntaxError(Exception):
@@ -48,9 +192,9 @@ class YaraRuleSyntaxError(Exception):
                         word=word)
             else:
                 # Parse syntax error reason out of the SyntaxError message.
-                log.debug(str(yara_syntax_error_exc))
-                log.debug(str(yara_syntax_error_exc).split(':'))
-                self.reason = str(yara_syntax_error_exc).split(':')[1][1:]
+                log.debug("%s", yara_syntax_error_exc)
+                error_match = YARA_ERROR_PATTERN.search(str(yara_syntax_error_exc))
+                self.reason = error_match.group(2) if error_match else str(yara_syntax_error_exc)
                 log.debug(self.reason)
 
                 self.message = "{reason} in string '{word}', columns: " \
@@ -93,9 +237,10 @@ class YaraMatchCallback:
 
     Official documentation: https://yara.readthedocs.io/en/latest/yarapython.html
     """
-    def __init__(self):
-        self.log = create_logger(__name__)
+    # Fields picked from the callback dict passed by yara.Rules.match.
+    __slots__ = ("matches", "rule", "namespace", "tags", "meta", "strings")
 
+    def __init__(self):
         self.matches = None
         self.rule = None
         self.namespace = None
@@ -125,20 +270,11 @@ class YaraMatchCallback:
 
         :return yara.CALLBACK_ABORT:    Stop after the first rule, as we only have one.
         """
-        self.log.info("YaraMatchCallback.callback({})".format(callback_dict))
-
-        if "matches" in callback_dict:
-            self.matches = callback_dict["matches"]
-        if "rule" in callback_dict:
-            self.rule = callback_dict["rule"]
-        if "namespace" in callback_dict:
-            self.namespace = callback_dict["namespace"]
-        if "tags" in callback_dict:
-            self.tags = callback_dict["tags"]
-        if "meta" in callback_dict:
-            self.meta = callback_dict["meta"]
-        if "strings" in callback_dict:
-            self.strings = callback_dict["strings"]
+        log.info("YaraMatchCallback.callback(%s)", callback_dict)
+
+        for field in self.__slots__:
+            if field in callback_dict:
+                setattr(self, field, callback_dict[field])
 
         # Stop applying rules to your data.
         return yara.CALLBACK_ABORT
@@ -163,7 +299,9 @@ class YaraRule:
         :param compiled_path:   Path to the compiled YARA rule
                                 (usually set when spawned by cls from_compiled_file).
         """
-        self.log = create_logger(__name__)
+        # Cached rendered source and referenced strings (see __str__ and get_referenced_strings).
+        self._rendered: Union[str, None] = None
+        self._referenced_strings: Union[List[YaraString], None] = None
 
         self.name: str = sanitize_identifier(name)
 
@@ -185,6 +323,24 @@ class YaraRule:
         self.compiled_path = compiled_path
         self.compiled_match_source = compiled_match_source
 
+    def __setattr__(self, key, value):
+        super().__setattr__(key, value)
+
+        if key in RENDERED_ATTRIBUTES:
+            self.invalidate_cached_source()
+
+    def invalidate_cached_source(self):
+        """
+        Invalidates the cached rendered source (and referenced strings).
+
+        Called automatically whenever a rendered attribute is (re)assigned,
+        but has to be called manually after in-place changes (e.g. rule.strings.append(...)).
+
+        :return:
+        """
+        super().__setattr__("_rendered", None)
+        super().__setattr__("_referenced_strings", None)
+
     @classmethod
     def from_dict(cls, dct: dict):
         """
@@ -219,112 +375,9 @@ class YaraRule:
         :param body:
         :return:
         """
-        # Create a copy of body to break down in order to find the true meta and string keywords
-        modified_body = copy.deepcopy(body)
-
-        # Make a pass to replace all string values with placeholders.
-        inside_quoted_string = False
-        inside_regex_string = False
-        inside_hex_string = False
-        inside_escape_sequence = False
-        inside_multichar_escape_sequence = False
-        inside_comment_line = False
-        comment_line = ""
-        comment_lines = []
-        inside_comment_block = False
-        comment_block = ""
-        comment_blocks = []
-        string_safe_body = ""
-        escape_terminators = ['\\', '"', 't', 'n']
-        escape_chars_not_to_replace = ['\n', '\t', '\r', '\b', '\f']
-        chars_not_to_replace = escape_chars_not_to_replace
-        chars_not_to_replace.extend(' ')
-        separators = [' ', '\n', '\t']
-
-        last_line_start_index = 0
-        line = ""
-        for i in range(len(modified_body)):
-            c = modified_body[i]  # Helps on readability.
-            line += c
-            if c == '\n':
-                # log.debug("line: {}".format(modified_body[last_line_start_index:i]))
-                last_line_start_index = i + 1
-                line = ""
-
-            if inside_quoted_string:
-                if inside_escape_sequence:
-                    if inside_multichar_escape_sequence:
-                        if is_hex_esc_sequence(modified_body[i - 3:i + 1]):
-                            inside_escape_sequence = False
-                            inside_multichar_escape_sequence = False
-                    else:
-                        if c in escape_terminators:
-                            inside_escape_sequence = False
-                        else:
-                            # If the char after \ isn't a terminator, then this is a hex/multichar escape sequence.
-                            inside_multichar_escape_sequence = True
-                else:
-                    if c == '\\':
-                        inside_escape_sequence = True
-                    elif c == '"':
-                        inside_quoted_string = False
-
-                # Replace current char with safe placeholder.
-                string_safe_body += STRING_PLACEHOLDER
-            elif inside_regex_string:
-                if c == '/' and modified_body[i + 1] in separators:
-                    inside_regex_string = False
-
-                # Replace current char with safe placeholder.
-                string_safe_body += REGEX_PLACEHOLDER
-            elif inside_hex_string:
-                if c == '}' and modified_body[i + 1] in separators:
-                    inside_hex_string = False
-
-                # Replace current char with safe placeholder.
-                string_safe_body += HEXADECIMAL_PLACEHOLDER
-            elif inside_comment_line:
-                comment_line += c
-
-                if c == '\n':
-                    string_safe_body += c
-                    log.info("comment line: {}".format(comment_line))
-                    comment_lines.append(comment_line)
-                    comment_line = ""
-                    inside_comment_line = False
-                else:
-                    string_safe_body += COMMENT_LINE_PLACEHOLDER
-            elif inside_comment_block:
-                comment_block += c
-
-                if c == '/' and modified_body[i - 1] == '*':
-                    log.info("comment block:\n{}".format(comment_block))
-                    string_safe_body += COMMENT_BLOCK_PLACEHOLDER
-                    comment_blocks.append(comment_block)
-                    comment_block = ""
-                    inside_comment_block = False
-                else:
-                    string_safe_body += COMMENT_BLOCK_PLACEHOLDER if c not in chars_not_to_replace else c
-            else:
-                if c == '"':
-                    inside_quoted_string = True
-                    string_safe_body += STRING_PLACEHOLDER
-                elif c == '/' and modified_body[i + 1] != '/' and modified_body[i + 1] != '*':
-                    inside_regex_string = True
-                elif c == '{':
-                    inside_hex_string = True
-                elif c == '/' and modified_body[i + 1] == '/':
-                    inside_comment_line = True
-                    comment_line += c
-                    string_safe_body += COMMENT_LINE_PLACEHOLDER
-                elif c == '/' and modified_body[i + 1] == '*':
-                    inside_comment_block = True
-                    comment_block += c
-                    string_safe_body += COMMENT_BLOCK_PLACEHOLDER
-                else:
-                    string_safe_body += c
-
-        return string_safe_body
+        # Replace every token which may contain unpredictable content with (same length) placeholders,
+        # this way indices in the string safe body also apply to the original body.
+        return SOURCE_BODY_TOKEN_PATTERN.sub(abstract_source_body_token, body)
 
     @staticmethod
     def parse_strings_body(strings_body):
@@ -336,8 +389,9 @@ class YaraRule:
         :param strings_body:
         :return:
         """
-        # Create a copy of body to break down in order to find the true meta and string keywords
-        modified_body = copy.deepcopy(strings_body)
+        # Blank out comments up front (keeping the length and lines of the body intact),
+        # so that the char-by-char loop below doesn't need to track them.
+        modified_body = SOURCE_BODY_TOKEN_PATTERN.sub(blank_comment_token, strings_body)
         has_pending_string = False
         inside_identifier = False
         inside_quoted_string = False
@@ -345,20 +399,11 @@ class YaraRule:
         inside_hex_string = False
         inside_escape_sequence = False
         inside_multichar_escape_sequence = False
-        inside_comment_line = False
-        inside_comment_block = False
         inside_possible_modifiers_segment = False
         inside_base64_modifier_payload_segment = False
         inside_xor_modifier_payload_segment = False
 
-        comment_line = ""
-        comment_lines = []
-        comment_block = ""
-        comment_blocks = []
         escape_terminators = ['\\', '"', 't', 'n']
-        escape_chars_not_to_replace = ['\n', '\t', '\r', '\b', '\f']
-        chars_not_to_replace = escape_chars_not_to_replace
-        chars_not_to_replace.extend(' ')
         separators = [' ', '\n', '\t']
 
         identifier = ""
@@ -370,7 +415,6 @@ class YaraRule:
         strings = []
 
         last_line_start_index = 0
-        line = ""
 
         def add_modifier(kw, data, mod_list):
             mod_list.append({
@@ -386,18 +430,17 @@ class YaraRule:
                 "modifiers": t_modifiers
             }
 
-            log.info("Adding YARA String '{identifier}':\n{js}".format(
-                identifier=identifier, js=json.dumps(_, indent=4)))
+            if log.isEnabledFor(logging.INFO):
+                log.info("Adding YARA String '%s':\n%s", identifier, json.dumps(_, indent=4))
 
             strings.append(_)
 
         for i in range(len(modified_body)):
             c = modified_body[i]  # Helps on readability.
-            line += c
             if c == '\n':
-                log.debug("line: {}".format(modified_body[last_line_start_index:i]))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("line: %s", modified_body[last_line_start_index:i])
                 last_line_start_index = i + 1
-                line = ""
 
             if inside_identifier:
                 if c in separators or c == '=':
@@ -481,6 +524,7 @@ class YaraRule:
                                 modifier_payload_string = ""
                             inside_base64_modifier_payload_segment = False
                         else:
+                            line = modified_body[last_line_start_index:i + 1]
                             raise YaraRuleParserSyntaxError(
                                 "Unterminated YARA string modifier payload on this line: {}".format(line), line=line)
                 else:
@@ -506,21 +550,6 @@ class YaraRule:
                                             "Invalid backtracked modifier payload segment: {}".format(keyword))
                     # Make sure there exists more characters ahead, before attempting inner lookahead logic.
                     elif len(modified_body) > i+1:
-                        # Check that we're not actually inside a comment segment
-                        # or other such things that exist in the void.
-                        if c == '/' and modified_body[i + 1] == '/':
-                            comment_line += c
-                            inside_comment_line = True
-                            inside_possible_modifiers_segment = False
-
-                            continue
-                        elif c == '/' and modified_body[i + 1] == '*':
-                            comment_block += c
-                            inside_comment_block = True
-                            inside_possible_modifiers_segment = False
-
-                            continue
-
                         # We're now sure that we're *actually* inside the modifier segment.
                         if c not in separators and c != '':
                             modifier_string += c
@@ -551,22 +580,6 @@ class YaraRule:
 
                         inside_possible_modifiers_segment = False
 
-            elif inside_comment_line:
-                comment_line += c
-
-                if c == '\n':
-                    log.info("comment line: {}".format(comment_line))
-                    comment_lines.append(comment_line)
-                    comment_line = ""
-                    inside_comment_line = False
-            elif inside_comment_block:
-                comment_block += c
-
-                if c == '/' and modified_body[i - 1] == '*':
-                    log.info("comment block:\n{}".format(comment_block))
-                    comment_blocks.append(comment_block)
-                    comment_block = ""
-                    inside_comment_block = False
             else:
                 if c == YARA_VAR_SYMBOL:
                     if has_pending_string:
@@ -583,18 +596,12 @@ class YaraRule:
                 elif c == '"':
                     inside_quoted_string = True
                     string_type = TEXT_TYPE
-                elif c == '/' and modified_body[i + 1] != '/' and modified_body[i + 1] != '*':
+                elif c == '/':
                     inside_regex_string = True
                     string_type = REGEX_TYPE
                 elif c == '{':
                     inside_hex_string = True
                     string_type = HEX_TYPE
-                elif c == '/' and modified_body[i + 1] == '/':
-                    inside_comment_line = True
-                    comment_line += c
-                elif c == '/' and modified_body[i + 1] == '*':
-                    inside_comment_block = True
-                    comment_block += c
 
             # If we're at the end of body, do some necessary operations.
             if len(modified_body)-1 == i:
@@ -612,18 +619,14 @@ class YaraRule:
         try:
             log.debug(source_code)
 
-            constructor_line_pattern = re.compile(
-                r"(?P<rule_keyword>rule)\s+(?P<rule_identifier>\w+)\s*"
-                r"(?P<tag_body>(?P<tag_delimiter>:)\s*(?P<tags>[\s+\w]+))?\{(?P<rule_body>.*)\}",
-                re.MULTILINE | re.DOTALL)
-
-            rule_match = constructor_line_pattern.search(source_code)
+            rule_match = RULE_CONSTRUCTOR_PATTERN.search(source_code)
 
             log.debug(rule_match)
             if not rule_match:
                 raise ValueError("Rule did not match!\n{source}\n{match}".format(source=source_code, match=rule_match))
 
-            log.debug("rule_match groupdict:\n{}".format(rule_match.groupdict()))
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("rule_match groupdict:\n%s", rule_match.groupdict())
 
             name = rule_match.groupdict()["rule_identifier"]
 
@@ -642,22 +645,21 @@ class YaraRule:
 
             body = rule_match.groupdict()["rule_body"]
 
-            log.debug("body:\n{}".format(body))
+            log.debug("body:\n%s", body)
 
             # Seek thru the whole shebang until you match keyword:
 
             # Generate a string safe copy of the body, which won't contain irrelevant extra ':' chars etc.
             string_safe_body = cls.abstract_source_body(body)
 
-            log.info("string-safe body:\n{}".format(string_safe_body))
+            log.info("string-safe body:\n%s", string_safe_body)
 
             # Get index of meta and strings (if either is present)
             meta_index = string_safe_body.find("meta:")
             strings_index = string_safe_body.find("strings:")
             condition_index = string_safe_body.find("condition:")
 
-            log.info("Meta @ {m}, Strings @ {s}, Condition @ {c}".format(
-                m=meta_index, s=strings_index, c=condition_index))
+            log.info("Meta @ %s, Strings @ %s, Condition @ %s", meta_index, strings_index, condition_index)
 
             # Make a second pass with a pattern that doesn't use dotall, in order to better parse each sub-body,
             # FIXME: Check if meta can go after string in a rule (read: more headache if-spaghetti needed if so...)
@@ -667,20 +669,17 @@ class YaraRule:
                 if strings_index > -1:
                     # If we have strings, then that is our body part cutoff.
                     meta_body = body[meta_index+len("meta:"):strings_index]
-                    log.info("meta body:\n{}".format(meta_body))
+                    log.info("meta body:\n%s", meta_body)
                 else:
                     # If we don't have strings then condition will be our body part cutoff.
                     meta_body = body[meta_index+len("meta:"):condition_index]
-                    log.info("meta body:\n{}".format(meta_body))
-
-                # Parse meta body items into a list of regex match group dicts.:
-                p = re.compile(
-                    r"\s*(?P<full>(?P<identifier>\w+)\s*=\s*(?P<value>\".*\"|true|false|[0-9]*)).*",
-                    re.MULTILINE)
+                    log.info("meta body:\n%s", meta_body)
 
+                # Parse meta body items into a list of regex match group dicts.
                 # Use finditer() to get a sequence of match objects, in order to get the groupdict for each match.
-                match_dicts = [m.groupdict() for m in p.finditer(meta_body)]
-                log.info("meta body match dict:\n{}".format(json.dumps(match_dicts, indent=4)))
+                match_dicts = [m.groupdict() for m in META_ITEM_PATTERN.finditer(meta_body)]
+                if log.isEnabledFor(logging.INFO):
+                    log.info("meta body match dict:\n%s", json.dumps(match_dicts, indent=4))
 
                 # Parse matched dicts into a list of YaraMeta objects.
                 meta = []
@@ -696,15 +695,17 @@ class YaraRule:
 
                     meta.append(YaraMeta(identifier, value, value_type))
 
-                log.info("Parsed YaraMeta objects:\n{}".format(json.dumps([repr(o) for o in meta], indent=4)))
+                if log.isEnabledFor(logging.INFO):
+                    log.info("Parsed YaraMeta objects:\n%s", json.dumps([repr(o) for o in meta], indent=4))
 
             if strings_index > -1:
                 strings_body = body[strings_index+len("strings:"):condition_index]
-                log.info("strings body:\n{}".format(strings_body))
+                log.info("strings body:\n%s", strings_body)
 
                 # Parse strings programmatically (wildcard content makes regex approach exceedingly hard)
                 parsed_string_dicts = cls.parse_strings_body(strings_body)
-                log.info("Parsed YARA string dicts:\n{}".format(json.dumps(parsed_string_dicts, indent=4)))
+                if log.isEnabledFor(logging.INFO):
+                    log.info("Parsed YARA string dicts:\n%s", json.dumps(parsed_string_dicts, indent=4))
 
                 # Parse parsed YARA string dicts into a list of YaraString objects.
                 strings = [
@@ -737,14 +738,15 @@ class YaraRule:
 
             condition = YaraCondition(condition_str)
 
-            parsed_source = {
-                "name": name,
-                "tags": tags,
-                "meta": [repr(o) for o in meta] if isinstance(meta, list) else None,
-                "strings": [repr(o) for o in strings] if isinstance(strings, list) else None,
-                "condition": repr(condition)
-            }
-            log.info("parsed_source:\n{}".format(json.dumps(parsed_source, indent=4)))
+            if log.isEnabledFor(logging.INFO):
+                parsed_source = {
+                    "name": name,
+                    "tags": tags,
+                    "meta": [repr(o) for o in meta] if isinstance(meta, list) else None,
+                    "strings": [repr(o) for o in strings] if isinstance(strings, list) else None,
+                    "condition": repr(condition)
+                }
+                log.info("parsed_source:\n%s", json.dumps(parsed_source, indent=4))
 
             return cls(name, tags, meta, strings, condition)
 
@@ -762,38 +764,38 @@ class YaraRule:
 
     @classmethod
     def _legacy_from_source_file_yara_python(cls, source_path=None):
-        """Initialize YaraRule from sourcecode using the limited yara-python API."""
+        """
+        Initialize YaraRule from sourcecode using the limited yara-python API.
+
+        NB: Requires compiling the rule, use from_source_file when only the rule's contents are needed.
+        """
         try:
+            # Read the source file once, for matching and extracting the condition.
+            with open(source_path, 'rb') as f:
+                source_bytes = f.read()
+            # NB: Only used for extracting the condition, so tolerate source files that aren't UTF-8.
+            source_code = source_bytes.decode('utf-8', 'backslashreplace')
+
             # Compile the YARA source code (only way to get yara-python to parse the thing)
+            # NB: Compiled from the file, for include paths to be resolved relative to it.
             yar_compiled = yara.compile(filepath=source_path)
 
             # Get the parsed source code via yara.Rules.match
-            yar_src = yar_compiled.match(filepath=source_path)[0]
+            yar_src = yar_compiled.match(data=source_bytes)[0]
 
             name = yar_src.rule
             namespace = yar_src.namespace
             tags = yar_src.tags
             meta = [YaraMeta(identifier, value) for identifier, value in yar_src.meta.items()]
-            strings = [YaraString(identifier, value.decode('utf-8')) for offset, identifier, value in yar_src.strings]
+            strings = [
+                YaraString(identifier, decode_string_value(value)) for offset, identifier, value in yar_src.strings]
 
-            # Get condition from the sourcecode file by hand due to it not being part of yara.Rules.
+            # Get condition from the sourcecode by hand due to it not being part of yara.Rules.
             condition = None
-            this_is_the_condition = False
-            with open(source_path, 'r') as f:
-                for line in f.readlines():
-                    if this_is_the_condition:
-                        # Strip leading whitespace/indent.
-                        for i in range(len(line)):
-                            if line[i] == ' ':
-                                continue
-                            else:
-                                condition = YaraCondition(line[i:].strip('\n'))
-                                break
-                        break
-
-                    if 'condition' in line.lower():
-                        # Next line will contain the actual condition, this one just has the declaration.
-                        this_is_the_condition = True
+            condition_match = CONDITION_SECTION_PATTERN.search(source_code)
+
+            if condition_match:
+                condition = YaraCondition(condition_match.group(1).strip())
 
             log.debug(condition)
 
@@ -853,7 +855,8 @@ class YaraRule:
         namespace = yara_match_callback.namespace
         name = yara_match_callback.rule
         strings = [
-            YaraString(identifier, value.decode('utf-8')) for offset, identifier, value in yara_match_callback.strings]
+            YaraString(identifier, decode_string_value(value))
+            for offset, identifier, value in yara_match_callback.strings]
         tags = yara_match_callback.tags
 
         if not yara_match_callback.matches:
@@ -862,7 +865,7 @@ class YaraRule:
         else:
             log.info("Compiled YARA matches source code.")
             match = matches[0]
-            log.info("match: {}".format(match))
+            log.info("match: %s", match)
 
         if isinstance(yara_rules, yara.Rules) and compiled_filepath is None:
             log.warning("yara.Rules object was given, but compiled_filepath was not set, "
@@ -878,37 +881,52 @@ class YaraRule:
         In YARA it is a SyntaxError to have defined strings that are not referenced in
         the condition, so these need to be rinsed out before rule compilation.
 
+        The result is cached until invalidated, see invalidate_cached_source.
+
         :return: Returns list of strings that are referenced in the conditional statement.
         """
-        # Find all occurrences of words starting with $ (i.e. variable names)
-        r = re.compile(r'[$#][\w]*\b\S+')
-        matched_condition_strings = r.findall(str(self.condition))
+        if self._referenced_strings is not None:
+            return list(self._referenced_strings)
+
+        # Without a condition, no strings are referenced.
+        if self.condition is None:
+            self._referenced_strings = []
+
+            return []
+
+        # "them" references all of the strings.
+        if CONDITION_ALL_STRINGS_KEYWORD in self.condition.values:
+            self._referenced_strings = list(self.strings)
+
+            return list(self._referenced_strings)
+
+        # Find all identifiers referenced by $, #, @ or ! (i.e. variable names)
+        matched_condition_identifiers = CONDITION_VAR_PATTERN.findall(str(self.condition))
 
         # Create a dict of own YaraString objects by identifier.
         my_strings_by_identifier = {x.identifier: x for x in self.strings}
 
-        log.debug("My identifiers: {}".format(my_strings_by_identifier.keys()))
-        log.debug("Matched YARA strings in condition: {}".format([x[1:] for x in matched_condition_strings]))
+        log.debug("My identifiers: %s", my_strings_by_identifier.keys())
+        log.debug("Matched YARA strings in condition: %s", matched_condition_identifiers)
 
-        # Get rid of mismatches by making a list of items that only matches the actual strings/vars list.
-        referenced_yara_strings = []
-        # List of matched identifiers to avoid needing to loop through each YaraString in the above list.
-        matched_identifiers = []
-        for matched_condition_string in matched_condition_strings:
-            # Strip the var/count/etc denominator symbol to match my_idents entry format.
-            identifier = matched_condition_string[1:]
+        # Get rid of mismatches by only keeping items that match the actual strings/vars list.
+        # Keyed by identifier to avoid duplicate entries, while preserving the order they were referenced in.
+        referenced_yara_strings = {}
+        for identifier in matched_condition_identifiers:
+            if identifier.endswith('*'):
+                # Wildcard, references every string starting with the prefix (e.g. $a* or $*).
+                prefix = identifier[:-1]
+                for my_identifier, my_string in my_strings_by_identifier.items():
+                    if my_identifier.startswith(prefix) and my_identifier not in referenced_yara_strings:
+                        referenced_yara_strings[my_identifier] = my_string
+            elif identifier in my_strings_by_identifier and identifier not in referenced_yara_strings:
+                referenced_yara_strings[identifier] = my_strings_by_identifier[identifier]
 
-            if identifier in my_strings_by_identifier.keys():
-                # Avoid duplicate entries.
-                if identifier not in matched_identifiers:
-                    # Append the string identified by this identifier to the list of confirmed YaraString objects.
-                    referenced_yara_strings.append(my_strings_by_identifier[identifier])
-                    # Append the identifier to list used for duplication check.
-                    matched_identifiers.append(identifier)
+        log.debug("referenced identifiers: %s", referenced_yara_strings.keys())
 
-        log.debug("referenced identifiers: {}".format([x.identifier for x in referenced_yara_strings]))
+        self._referenced_strings = list(referenced_yara_strings.values())
 
-        return referenced_yara_strings
+        return list(self._referenced_strings)
 
     def condition_as_lines(self) -> str:
         """
@@ -921,6 +939,9 @@ class YaraRule:
     def __str__(self, condition_as_lines=False) -> str:
         """
         Generates a YARA rule on string form.
+
+        The regular (non condition_as_lines) rendering is cached until invalidated,
+        see invalidate_cached_source.
     
         example format:
             rule RuleIdentifier
@@ -937,50 +958,45 @@ class YaraRule:
     
         :return:
         """
-        indent = 4 * " "
-        identifier_line = "rule {name}".format(name=self.name)
-        meta = ""
-        strings = ""
-        if condition_as_lines:
-            condition = "{indent}condition:\n{indent}{indent}{condition}".format(
-                indent=indent, condition=self.condition_as_lines())
-        else:
-            condition = "{indent}condition:\n{indent}{indent}{condition}".format(
-                indent=indent, condition=str(self.condition))
-    
+        if not condition_as_lines and self._rendered is not None:
+            return self._rendered
+
         # Append tags to rule line, if provided.
         tags_str = ""
         if self.tags is not None:
             if len(self.tags) > 0:
                 tags_str = (": " + " ".join(self.tags))
-    
-        # Add the meta info block, if provided.
-        if self.meta is not None:
-            if bool(self.meta):
-                meta = "{indent}meta:".format(indent=indent)
-                for ym in self.meta:
-                    meta += "\n{indent}{indent}{yara_meta}".format(indent=indent, yara_meta=str(ym))
-    
-        # Add the strings (read: variables) block, id provided.
-        if self.strings is not None:
-            if bool(self.strings):
-                strings = "{indent}strings:".format(indent=indent)
-                for ys in self.get_referenced_strings():
-                    strings += "\n{indent}{indent}{yara_string}".format(indent=indent, yara_string=str(ys))
+
+        lines = ["rule {name}{tags_str}".format(name=self.name, tags_str=tags_str), "{"]
+
+        # Add the meta info block, if provided (followed by a blank line either way).
+        if self.meta:
+            lines.append(INDENT + "meta:")
+            lines.extend(INDENT2 + str(ym) for ym in self.meta)
+        else:
+            lines.append("")
+        lines.append("")
+
+        # Add the strings (read: variables) block, if provided (followed by a blank line either way).
+        if self.strings:
+            lines.append(INDENT + "strings:")
+            lines.extend(INDENT2 + str(ys) for ys in self.get_referenced_strings())
+        else:
+            lines.append("")
+        lines.append("")
+
+        lines.append(INDENT + "condition:")
+        lines.append(INDENT2 + (self.condition_as_lines() if condition_as_lines else str(self.condition)))
+        lines.append("}")
 
         # Compile the entire rule block string.
-        rule_string = \
-            "{identifier_line}{tags_str}\n" \
-            "{start}\n" \
-            "{meta}\n" \
-            "\n" \
-            "{strings}\n" \
-            "\n" \
-            "{condition}\n" \
-            "{end}\n".format(identifier_line=identifier_line, tags_str=tags_str,
-                             meta=meta, strings=strings, condition=condition, start='{', end='}')
-    
+        rule_string = "\n".join(lines) + "\n"
+
         log.debug(rule_string)
+
+        if not condition_as_lines:
+            self._rendered = rule_string
+
         return rule_string
 
     def save_source(self, filename: str = None, file_ext=SOURCE_FILE_EXTENSION, rules_dir=RULES_DIR) -> str:
@@ -996,19 +1012,82 @@ class YaraRule:
             filename = self.name
 
         # If destination directory does not exist, create it.
-        if not os.path.isdir(rules_dir):
-            os.mkdir(rules_dir)
+        ensure_rules_dir(rules_dir)
 
         filepath = Path(rules_dir).joinpath(filename + file_ext)
 
-        # Save YARA source rule to plaintext file using regular Python standard file I/O.
-        with open(filepath, 'w') as f:
-            f.write(self.__str__())
+        # Save YARA source rule to plaintext file.
+        filepath.write_text(self.__str__())
 
-        self.log.info("Save YARA rules to file: {}".format(filepath))
+        log.info("Save YARA rules to file: %s", filepath)
 
         return str(filepath.resolve(strict=True))
 
+    @classmethod
+    def save_sources(cls, rules: list, file_ext=SOURCE_FILE_EXTENSION, rules_dir=RULES_DIR,
+                     buffer_size=SAVE_SOURCES_BUFFER_SIZE) -> List[str]:
+        """
+        Bulk version of save_source, saves the source (plaintext) of multiple YARA rules to files.
+
+        Rather than syncing/resolving each file, the directory is synced once all files have been written.
+
+        :param rules:       List of YaraRule, a rule sharing name with a previous one overwrites its file.
+        :param file_ext:
+        :param rules_dir:
+        :param buffer_size: Write buffer size.
+        :return: List of saved filepaths (in the same order as rules).
+        """
+        ensure_rules_dir(rules_dir)
+        real_rules_dir = os.path.realpath(rules_dir)
+
+        filepaths = []
+        for rule in rules:
+            filepath = os.path.join(real_rules_dir, rule.name + file_ext)
+
+            with open(filepath, 'wb', buffering=buffer_size) as f:
+                f.write(rule.__str__().encode('utf-8'))
+
+            filepaths.append(filepath)
+
+        # Persist the (new) directory entries in one go (not supported on all platforms, e.g. Windows).
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(real_rules_dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+        log.info("Saved %d YARA rules to files in: %s", len(filepaths), real_rules_dir)
+
+        return filepaths
+
+    def determine_errored_word_index(self, yara_syntax_error_exc) -> Union[int, None]:
+        """
+        Determines the index of the errored word in the condition from the token quoted in the error message.
+
+        :param yara_syntax_error_exc:
+        :return:                        Index into condition.values (None if the token isn't found).
+        """
+        if self.condition is None:
+            return None
+
+        token_match = YARA_ERROR_TOKEN_PATTERN.search(str(yara_syntax_error_exc))
+        if token_match is None:
+            return None
+
+        token = token_match.group(1)
+        values = self.condition.values
+
+        if token in values:
+            return values.index(token)
+
+        # The token may be the module of a word, e.g. identifier "pe" in "pe.number_of_sections".
+        for idx, value in enumerate(values):
+            if value.startswith(token + "."):
+                return idx
+
+        return None
+
     def determine_syntax_error_column(self, yara_syntax_error_exc, line_number: int, splitline_number: int,
                                       raise_exc=True) -> dict:
         """
@@ -1018,20 +1097,26 @@ class YaraRule:
         :param yara_syntax_error_exc:
         :param raise_exc:               Raises YaraRuleSyntaxError immediately upon finish.
         :param line_number:             Line number that failed in the whitespace string.
-        :param splitline_number:        Line number that failed in the newline string.
+        :param splitline_number:        Line number that failed in the newline string (None if unknown).
         :return:                        dict: {"column_number", "column_range", "word"}
         """
         global CONDITION_INDENT_LENGTH
 
-        # Create a list version of the conditions newline string, for convenience.
-        condition_as_lines_list = self.condition_as_lines().split('\n')
-
         # Get index of the errored word in the conditions list.
-        errored_word_index = splitline_number - line_number
+        errored_word_index = splitline_number - line_number if splitline_number is not None else None
+
+        if self.condition is not None and errored_word_index is not None \
+                and 0 <= errored_word_index < len(self.condition.values):
+            errored_word = self.condition.values[errored_word_index]
+            word_offset = self.condition.word_offsets()[errored_word_index]
+        else:
+            # E.g. an empty condition or an unknown word, point at the start of the condition.
+            errored_word = ""
+            word_offset = 0
 
         # Figure out the distance in chars from start of condition to bad word.
-        # (Indent + chars-up-to-error + 1 whitespace + 1 human-readable-indexing)
-        char_offset = CONDITION_INDENT_LENGTH + len(" ".join(condition_as_lines_list[:errored_word_index])) + 1 + 1
+        # (Indent + chars-up-to-error + 1 human-readable-indexing)
+        char_offset = CONDITION_INDENT_LENGTH + word_offset + 1
 
         if raise_exc:
             raise YaraRuleSyntaxError(message=None,
@@ -1039,72 +1124,158 @@ class YaraRule:
                                       rule=self,
                                       line_number=line_number,
                                       column_number=str(char_offset),
-                                      column_range=str(char_offset + len(condition_as_lines_list[errored_word_index])),
-                                      word=condition_as_lines_list[errored_word_index])
+                                      column_range=str(char_offset + len(errored_word)),
+                                      word=errored_word)
         else:
             return {
                 "column_number": str(char_offset),
-                "column_range": str(char_offset + len(condition_as_lines_list[errored_word_index])),
-                "word": condition_as_lines_list[errored_word_index]
+                "column_range": str(char_offset + len(errored_word)),
+                "word": errored_word
             }
 
-    def compile(self, save_file=True, error_on_warning=False, **kwargs):
+    @classmethod
+    def compile_many(cls, rules: list, compiled_filepath: str = None, error_on_warning=False, **kwargs) -> yara.Rules:
+        """
+        Compile multiple YARA rules into a single yara.Rules object (sharing one Aho-Corasick automaton).
+
+        Each rule is compiled into its namespace (or a namespace of its own name, if unset).
+
+        NB: As the rules are compiled together, a single invalid rule fails the whole compilation,
+            use YaraRule.compile to validate individual rules.
+
+        :param rules:               List of YaraRule.
+        :param compiled_filepath:   Saves the compiled (binary blob) YARA rules to this file, if set.
+        :param error_on_warning:    If true warnings are treated as errors, raising an exception.
+        :param kwargs:              https://yara.readthedocs.io/en/latest/yarapython.html#yara.yara.compile
+        :return:
+        """
+        compiled_blob = yara.compile(
+            sources=join_namespaced_sources(
+                (rule.namespace if rule.namespace else rule.name, rule.__str__()) for rule in rules),
+            error_on_warning=error_on_warning, **kwargs)
+
+        if compiled_filepath is not None:
+            compiled_blob.save(compiled_filepath)
+
+        return compiled_blob
+
+    def compile(self, save_file=True, error_on_warning=False, validate_only=False, **kwargs):
         """
         Compile YARA sourcecode into a binary (blob) file.
 
         :param save_file:           Saves compiled (binary blob) YARA rule to file.
         :param error_on_warning:    If true warnings are treated as errors, raising an exception.
+        :param validate_only:       Only check that the rule compiles (raising on errors as usual),
+                                    without touching compiled_blob or any files (save_file is ignored).
         :param kwargs:              https://yara.readthedocs.io/en/latest/yarapython.html#yara.yara.compile
         :return:
         """
+        source = self.__str__()
+
+        # Identical sources compile to identical rules, so reuse previously compiled ones
+        # (kwargs like externals/includes affect compilation, so don't cache those).
+        cache_key = None
+        if not kwargs:
+            cache_key = source_digest(source) + bytes([error_on_warning])
+
         try:
-            self.compiled_blob: yara.Rules = yara.compile(
-                source=self.__str__(), error_on_warning=error_on_warning, **kwargs)
+            compiled_blob = get_cached_compiled_rules(cache_key) if cache_key is not None else None
+
+            # If the compiled file on disk was compiled from this exact source, there's no need to recompile/resave.
+            compiled_file_is_current = save_file and not validate_only and cache_key is not None \
+                and self.compiled_file_is_current(cache_key)
+
+            if compiled_blob is None and compiled_file_is_current:
+                # Loading the (serialized) compiled rule is far cheaper than compiling the source.
+                compiled_blob = yara.load(filepath=os.path.join(RULES_DIR, self.name + COMPILED_FILE_EXTENSION))
+                cache_compiled_rules(cache_key, compiled_blob)
+
+            if compiled_blob is None:
+                compiled_blob = yara.compile(source=source, error_on_warning=error_on_warning, **kwargs)
+
+                if cache_key is not None:
+                    cache_compiled_rules(cache_key, compiled_blob)
+
+            if validate_only:
+                return
 
-            if save_file:
-                self.save_compiled()
+            self.compiled_blob: yara.Rules = compiled_blob
+
+            if compiled_file_is_current:
+                self.compiled_path = os.path.join(RULES_DIR, self.name + COMPILED_FILE_EXTENSION)
+            elif save_file:
+                self.save_compiled(digest=cache_key)
         except yara.SyntaxError as e:
-            # Get line number (split on colon, then split first element
-            # on whitespace, then grab the last element).
-            line_number = str(e).split(':')[0].split(' ')[-1]
+            # Get line number.
+            error_match = YARA_ERROR_PATTERN.search(str(e))
+            if error_match is None:
+                # Without a line number there's no telling which word failed.
+                raise
+
+            line_number = int(error_match.group(1))
+
+            # Determine the column (and range) that failed.
+            # NB: The errored word is located by the token quoted in the (original) exception, rather than
+            #     by paying for a second (failed) compilation with the condition as newlined strings.
+            errored_word_index = self.determine_errored_word_index(e)
+            splitline_number = line_number + errored_word_index if errored_word_index is not None else None
+            self.determine_syntax_error_column(e, line_number, splitline_number, raise_exc=True)
+
+    def compiled_file_is_current(self, digest: bytes, filename: str = None, file_ext=COMPILED_FILE_EXTENSION,
+                                 rules_dir=RULES_DIR) -> bool:
+        """
+        Checks if the compiled (binary blob) YARA rule file was compiled from the source with the given digest.
 
-            try:
-                # Attempt to determine column no:
-                # Attempt a new (failed) compilation with condition as newlined strings,
-                # in order to detect which word it fails on.
-                self.compiled_blob: yara.Rules = yara.compile(
-                    source=self.__str__(condition_as_lines=True), error_on_warning=error_on_warning, **kwargs)
-
-            except yara.SyntaxError as yara_condition_newlined_exc:
-                log.info("Caught YARA Syntax Error with newlined condition, "
-                         "now determining the column (and range) that failed, "
-                         "then raising an improved Syntax Exception...", exc_info=yara_condition_newlined_exc)
-                splitline_number = int(str(e).split(':')[0].split(' ')[-1])
-
-                # Determine the column (and range) that failed,
-                # using line and splitline to determine the true word offset.
-                self.determine_syntax_error_column(e, int(line_number), splitline_number, raise_exc=True)
-
-    def save_compiled(self, filename: str = None, file_ext=COMPILED_FILE_EXTENSION, rules_dir=RULES_DIR):
+        :param digest:      Digest of the source (see YaraRule.compile).
+        :param filename:
+        :param file_ext:
+        :param rules_dir:
+        :return:
+        """
+        if filename is None:
+            filename = self.name
+
+        filepath = os.path.join(rules_dir, filename + file_ext)
+
+        try:
+            with open(filepath + COMPILED_DIGEST_FILE_EXTENSION, 'r') as f:
+                return f.read() == digest.hex() and os.path.isfile(filepath)
+        except FileNotFoundError:
+            return False
+
+    def save_compiled(self, filename: str = None, file_ext=COMPILED_FILE_EXTENSION, rules_dir=RULES_DIR,
+                      digest: bytes = None):
         """
         Saves compiled (binary blob) YARA rule to file.
 
         :param filename:
         :param file_ext:
         :param rules_dir:
+        :param digest:      Digest of the source the rule was compiled from, stored in a sidecar file
+                            in order to skip recompilation of unchanged sources (see YaraRule.compile).
         :return:
         """
         if filename is None:
             filename = self.name
 
         # If destination directory does not exist, create it.
-        if not os.path.isdir(rules_dir):
-            os.mkdir(rules_dir)
+        ensure_rules_dir(rules_dir)
 
         filepath = os.path.join(rules_dir, filename + file_ext)
 
         # Save compiled YARA rule to binary file using the Yara class' builtin.
         self.compiled_blob.save(filepath)
 
+        # Store (or invalidate any stale) digest of the source the compiled file came from.
+        digest_filepath = filepath + COMPILED_DIGEST_FILE_EXTENSION
+        if digest is not None:
+            with open(digest_filepath, 'w') as f:
+                f.write(digest.hex())
+        else:
+            try:
+                os.remove(digest_filepath)
+            except FileNotFoundError:
+                pass
+
         # Store filepath in self for later reference.
         self.compiled_path = filepath
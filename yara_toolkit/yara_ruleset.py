@@ -0,0 +1,304 @@
+import os
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+import yara
+
+from handlers.log_handler import create_logger
+from yara_toolkit.utils import source_digest
+from yara_toolkit.yara_rule import YaraRule, RULES_DIR, SOURCE_FILE_EXTENSION, join_namespaced_sources
+
+log = create_logger(__name__)
+
+REBUILD_DEBOUNCE_SECONDS = 0.5
+# Minimum seconds between checking the sources directory for changes (see sync_sources_dir).
+SOURCES_DIR_SYNC_INTERVAL_SECONDS = 1.0
+
+
+class YaraRuleSet:
+    """
+    Application wide set of YARA rules, compiled into a single yara.Rules object.
+
+    YARA builds one Aho-Corasick automaton for all the strings of the rules it compiles together,
+    so matching against the combined set is far cheaper than compiling and matching each rule separately.
+
+    Rules are compiled into their namespace (or a namespace of their own name, if unset),
+    and (re)building is debounced so that bursts of added rules result in a single compilation.
+
+    Rules added in this process are only known to it, but (WSGI worker) processes are kept in sync through
+    the sources directory (see load_sources_dir), which every rule is saved to.
+
+    NB: Validation/preview of a single rule should still go through YaraRule.compile.
+    """
+    def __init__(self, debounce: float = REBUILD_DEBOUNCE_SECONDS,
+                 sync_interval: float = SOURCES_DIR_SYNC_INTERVAL_SECONDS):
+        """
+        :param debounce:        Seconds to wait for more changes before rebuilding.
+        :param sync_interval:   Minimum seconds between checking the sources directory for changes.
+        """
+        self.debounce = debounce
+        self.sync_interval = sync_interval
+
+        # Sources directory (see load_sources_dir).
+        self.rules_dir: Union[str, None] = None
+        self.file_ext = SOURCE_FILE_EXTENSION
+        # (mtime, size) of the source files loaded from rules_dir, keyed by rule name.
+        self._source_file_stats: Dict[str, Tuple[int, int]] = {}
+        self._last_sync: Union[float, None] = None
+        # Whether a source compiles on its own, keyed by source digest (see get_compilable_names).
+        self._compilable: Dict[bytes, bool] = {}
+
+        # (namespace, source) tuples keyed by rule name.
+        self.sources: Dict[str, Tuple[str, str]] = {}
+        self.compiled_blob: Union[yara.Rules, None] = None
+        # Digest of the namespaced sources compiled_blob was compiled from.
+        self.compiled_digest: Union[bytes, None] = None
+
+        # Guards sources, compiled_blob and compiled_digest (never held while compiling).
+        self._lock = threading.RLock()
+        # Serializes rebuilds, so that a rebuild of older sources can't replace that of newer ones.
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_timer: Union[threading.Timer, None] = None
+
+    def __len__(self):
+        return len(self.sources)
+
+    def add(self, rule: YaraRule):
+        """
+        Adds (or replaces) a rule and schedules a rebuild.
+
+        :param rule:
+        :return:
+        """
+        self.add_source(rule.name, rule.__str__(), namespace=rule.namespace)
+
+    def add_source(self, name: str, source: str, namespace: str = None):
+        """
+        Adds (or replaces) a rule by its source code and schedules a rebuild.
+
+        :param name:        Name of the rule.
+        :param source:      YARA source code.
+        :param namespace:   Namespace to compile the rule into (defaults to name).
+        :return:
+        """
+        with self._lock:
+            self.sources[name] = (namespace if namespace else name, source)
+            self.schedule_rebuild()
+
+    def remove(self, name: str):
+        """
+        Removes a rule by name and schedules a rebuild.
+
+        :param name:
+        :return:
+        """
+        with self._lock:
+            if self.sources.pop(name, None) is not None:
+                self.schedule_rebuild()
+
+    def load_sources_dir(self, rules_dir: str = RULES_DIR, file_ext: str = SOURCE_FILE_EXTENSION):
+        """
+        Adds every YARA source file in a directory (named after its file), then rebuilds once.
+
+        The directory is kept in sync with from then on (see sync_sources_dir).
+
+        :param rules_dir:
+        :param file_ext:
+        :return:
+        """
+        self.rules_dir = rules_dir
+        self.file_ext = file_ext
+
+        self.sync_sources_dir(force=True)
+        log.info("Loaded %d ruleset sources from '%s'.", len(self._source_file_stats), rules_dir)
+
+        self.rebuild()
+
+    def sync_sources_dir(self, force=False) -> bool:
+        """
+        (Re)loads the source files in the sources directory that were added or changed since last time,
+        and removes the sources of files that were removed.
+
+        Checks at most once per sync_interval, unless forced.
+
+        :param force:
+        :return: True if any sources changed.
+        """
+        if self.rules_dir is None:
+            return False
+
+        now = time.monotonic()
+        if not force and self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return False
+        self._last_sync = now
+
+        if not os.path.isdir(self.rules_dir):
+            log.warning("Unable to load ruleset sources, '%s' is not a directory!", self.rules_dir)
+            return False
+
+        stats = {}
+        for entry in os.scandir(self.rules_dir):
+            if entry.name.endswith(self.file_ext) and entry.is_file():
+                stat = entry.stat()
+                stats[entry.name[:-len(self.file_ext)]] = (stat.st_mtime_ns, stat.st_size)
+
+        changed_sources = {}
+        for name, stat in stats.items():
+            if self._source_file_stats.get(name) != stat:
+                try:
+                    with open(os.path.join(self.rules_dir, name + self.file_ext), 'r',
+                              encoding='utf-8', errors='backslashreplace') as f:
+                        changed_sources[name] = (name, f.read())
+                except FileNotFoundError:
+                    # Removed in the meantime.
+                    stats.pop(name)
+
+        removed_names = self._source_file_stats.keys() - stats.keys()
+
+        if not changed_sources and not removed_names:
+            return False
+
+        with self._lock:
+            self.sources.update(changed_sources)
+            for name in removed_names:
+                self.sources.pop(name, None)
+
+            self._source_file_stats = stats
+
+        return True
+
+    def schedule_rebuild(self):
+        """(Re)starts the debounce timer, rebuilding once no more changes have come in for a while."""
+        with self._lock:
+            if self._rebuild_timer is not None:
+                self._rebuild_timer.cancel()
+
+            self._rebuild_timer = threading.Timer(self.debounce, self.rebuild)
+            self._rebuild_timer.daemon = True
+            self._rebuild_timer.start()
+
+    @staticmethod
+    def get_namespaced_sources(sources: Dict[str, Tuple[str, str]], names=None) -> Dict[str, str]:
+        """
+        Returns the sources (of the given rule names, or all) concatenated by namespace.
+
+        :param sources: (namespace, source) tuples keyed by rule name.
+        :param names:
+        :return:        Dict on the form of {namespace: source}.
+        """
+        return join_namespaced_sources(sources[name] for name in (sources.keys() if names is None else names))
+
+    def get_compilable_names(self, sources: Dict[str, Tuple[str, str]]) -> List[str]:
+        """
+        Returns the names of the rules that compile on their own.
+
+        Results are remembered per source, so each (changed) source is only compiled on its own once.
+
+        :param sources: (namespace, source) tuples keyed by rule name.
+        :return:
+        """
+        compilable = {}
+        names = []
+        for name, (namespace, source) in sources.items():
+            digest = source_digest(source)
+            is_compilable = self._compilable.get(digest)
+
+            if is_compilable is None:
+                try:
+                    yara.compile(source=source)
+                    is_compilable = True
+                except yara.Error as exc:
+                    log.warning("Leaving uncompilable rule '%s' out of ruleset: %s", name, exc)
+                    is_compilable = False
+
+            compilable[digest] = is_compilable
+            if is_compilable:
+                names.append(name)
+
+        # Only remember the results of the current sources.
+        self._compilable = compilable
+
+        return names
+
+    def rebuild(self) -> Union[yara.Rules, None]:
+        """
+        Compiles all rules into a single yara.Rules object.
+
+        NB: Compilation happens on a snapshot of the sources, so adding rules meanwhile doesn't wait on it.
+
+        :return: The compiled rules, or None if there aren't any rules.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                if self._rebuild_timer is not None:
+                    self._rebuild_timer.cancel()
+                    self._rebuild_timer = None
+
+                sources = dict(self.sources)
+                compiled_blob = self.compiled_blob
+                compiled_digest = self.compiled_digest
+
+            if not sources:
+                compiled_blob, digest = None, None
+            else:
+                namespaced_sources = self.get_namespaced_sources(sources)
+
+                # Skip recompiling if nothing changed since the last build (e.g. a rule re-added as-is).
+                digest = source_digest("\0".join(ns + "\0" + src for ns, src in sorted(namespaced_sources.items())))
+                if digest == compiled_digest:
+                    return compiled_blob
+
+                # Leave out the rules already known not to compile, rather than failing on them every time.
+                compilable_sources = {name: (namespace, source) for name, (namespace, source) in sources.items()
+                                      if self._compilable.get(source_digest(source)) is not False}
+
+                try:
+                    compiled_blob = yara.compile(sources=self.get_namespaced_sources(compilable_sources))
+                except yara.Error as exc:
+                    log.warning("Failed to compile ruleset of %d rules, retrying without the offending ones: %s",
+                                len(compilable_sources), exc)
+
+                    try:
+                        compiled_blob = yara.compile(
+                            sources=self.get_namespaced_sources(sources, self.get_compilable_names(sources)))
+                    except yara.Error as retry_exc:
+                        # Keep serving the previous ruleset rather than none at all.
+                        log.exception("Failed to compile ruleset!", exc_info=retry_exc)
+                        return compiled_blob
+
+                log.info("Compiled ruleset of %d rules.", len(sources))
+
+            with self._lock:
+                self.compiled_blob = compiled_blob
+                self.compiled_digest = digest
+
+            return compiled_blob
+
+    def match(self, **kwargs) -> list:
+        """
+        Matches data against the combined ruleset.
+
+        Any pending rebuild is performed first, so recently added rules are always included,
+        as are rules saved to the sources directory by other processes (see sync_sources_dir).
+
+        :param kwargs:  https://yara.readthedocs.io/en/latest/yarapython.html#yara.Rules.match
+        :return:        List of yara.Match.
+        """
+        sources_dir_changed = self.sync_sources_dir()
+
+        with self._lock:
+            rebuild_pending = sources_dir_changed or self._rebuild_timer is not None or self.compiled_blob is None
+            compiled_blob = self.compiled_blob
+
+        if rebuild_pending:
+            compiled_blob = self.rebuild()
+
+        if compiled_blob is None:
+            return []
+
+        return compiled_blob.match(**kwargs)
+
+
+# Application wide ruleset.
+RULESET = YaraRuleSet()
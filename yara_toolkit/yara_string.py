@@ -3,6 +3,8 @@ from typing import Union, List
 from handlers.log_handler import create_logger
 from yara_toolkit.utils import sanitize_identifier, delimiter_wrap_type
 
+log = create_logger(__name__)
+
 YARA_VAR_SYMBOL = "$"
 
 # Modifier (constant) definitions
@@ -162,7 +164,6 @@ class YaraString:
                                 Valid modifiers: nocase, wide, ascii, xor, base64, base64wide, fullword or private.
         :param from_dict:       Define YARA String from a dict instead of individual values.
         """
-        self.log = create_logger(__name__)
         self.identifier = None
 
         if from_dict is not None:
@@ -190,18 +191,17 @@ class YaraString:
                 yara_string_modifier_objects = []
                 for modifier in modifiers:
                     if isinstance(modifier, str):
-                        self.log.info("Converting YARA String modifier keyword='{keyword}', type='str' "
-                                      "to YaraStringModifier object...".format(keyword=modifier))
+                        log.info("Converting YARA String modifier keyword='%s', type='str' "
+                                 "to YaraStringModifier object...", modifier)
 
                         yara_string_modifier_objects.append(YaraStringModifier(modifier))
                     elif isinstance(modifier, dict):
-                        self.log.info("Converting YARA String modifier keyword='{keyword}', data={data}, type='dict' "
-                                      "to YaraStringModifier object...".format(
-                                        keyword=modifier["keyword"], data=modifier["data"]))
+                        log.info("Converting YARA String modifier keyword='%s', data=%s, type='dict' "
+                                 "to YaraStringModifier object...", modifier["keyword"], modifier["data"])
 
                         yara_string_modifier_objects.append(YaraStringModifier(modifier["keyword"], modifier["data"]))
                     elif isinstance(modifier, YaraStringModifier):
-                        self.log.debug("Appending YaraStringModifier object to list: '{obj}'".format(obj=modifier))
+                        log.debug("Appending YaraStringModifier object to list: '%s'", modifier)
 
                         yara_string_modifier_objects.append(modifier)
                     else: